@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Compares SQLConnectionHandler.copy_columns against tuple based inserts
+
+The benchmark runs against the database of the gd configuration, where it
+creates (and drops afterwards) the table `gd_bench_copy`. The columns are
+NumPy arrays; the tuple based inserts first convert them to a list of tuples,
+as needed by executemany. Requires NumPy.
+
+Usage: python benchmarks/bench_copy_columns.py [n_rows]
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import print_function
+from sys import argv
+from time import time
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from gd.sql_connection import SQLConnectionHandler
+
+
+def insert_executemany(conn_handler, columns):
+    rows = list(zip(*[values.tolist() for values in columns.values()]))
+    conn_handler.executemany(
+        "INSERT INTO gd_bench_copy (id, value, flag) VALUES (%s, %s, %s)",
+        rows)
+
+
+def insert_values(conn_handler, columns):
+    rows = list(zip(*[values.tolist() for values in columns.values()]))
+    with conn_handler.get_postgres_cursor() as cur:
+        execute_values(
+            cur, "INSERT INTO gd_bench_copy (id, value, flag) VALUES %s",
+            rows, page_size=1000)
+    conn_handler._connection.commit()
+
+
+def copy_columns(conn_handler, columns):
+    conn_handler.copy_columns('gd_bench_copy', columns)
+
+
+def main(n_rows):
+    columns = {'id': np.arange(n_rows, dtype=np.int64),
+               'value': np.random.random(n_rows),
+               'flag': np.random.random(n_rows) > 0.5}
+    conn_handler = SQLConnectionHandler()
+    for name, load in [('executemany', insert_executemany),
+                       ('execute_values', insert_values),
+                       ('copy_columns', copy_columns)]:
+        conn_handler.execute(
+            "CREATE TABLE gd_bench_copy (id bigint, value float8, flag bool)")
+        try:
+            start = time()
+            load(conn_handler, columns)
+            elapsed = time() - start
+        finally:
+            conn_handler.execute("DROP TABLE gd_bench_copy")
+        print("%-15s %9d rows %9.3f s %12.0f rows/s"
+              % (name, n_rows, elapsed, n_rows / elapsed))
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 200000)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Compares SQLConnectionHandler.upsert_many against a queue of upserts
+
+The benchmark runs against the database of the gd configuration, where it
+creates (and drops afterwards) the table `gd_bench_upsert`. Half of the rows
+of each round already exist in the table, so they are updated.
+
+Usage: python benchmarks/bench_upsert.py [n_rows]
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import print_function
+from sys import argv
+from time import time
+
+from gd.sql_connection import SQLConnectionHandler
+
+
+def _rows(n_rows, offset):
+    return [{'id': i, 'name': 'name %d' % i, 'value': i * 0.5}
+            for i in range(offset, offset + n_rows)]
+
+
+def upsert_queue(conn_handler, rows):
+    conn_handler.create_queue('bench')
+    for row in rows:
+        conn_handler.add_to_queue(
+            'bench',
+            "INSERT INTO gd_bench_upsert (id, name, value) "
+            "VALUES (%s, %s, %s) ON CONFLICT (id) DO UPDATE "
+            "SET name = EXCLUDED.name, value = EXCLUDED.value",
+            [row['id'], row['name'], row['value']])
+    conn_handler.execute_queue('bench')
+
+
+def upsert_many(conn_handler, rows):
+    conn_handler.upsert_many('gd_bench_upsert', ['id'], rows)
+
+
+def main(n_rows):
+    conn_handler = SQLConnectionHandler()
+    for name, upsert in [('execute_queue', upsert_queue),
+                         ('upsert_many', upsert_many)]:
+        conn_handler.execute(
+            "CREATE TABLE gd_bench_upsert (id bigint PRIMARY KEY, "
+            "name varchar, value float8)")
+        try:
+            upsert(conn_handler, _rows(n_rows // 2, 0))
+            rows = _rows(n_rows, 0)
+            start = time()
+            upsert(conn_handler, rows)
+            elapsed = time() - start
+        finally:
+            conn_handler.execute("DROP TABLE gd_bench_upsert")
+        print("%-14s %8d rows %9.3f s %12.0f rows/s"
+              % (name, n_rows, elapsed, n_rows / elapsed))
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 20000)
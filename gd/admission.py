@@ -0,0 +1,191 @@
+r"""
+Admission control (:mod:`gd.admission`)
+=======================================
+
+.. currentmodule:: gd.admission
+
+This module provides a concurrency limiter that sits in front of the
+execution of :class:`gd.sql_connection.SQLConnectionHandler` calls, so
+latency-sensitive queries are not starved by bulk work sharing the process.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   AdmissionController
+
+Examples
+--------
+Allow up to 8 interactive and 2 batch calls at the same time, and at most 8
+calls overall, giving precedence to the interactive ones. Interactive calls
+give up after waiting 0.5 seconds to be admitted:
+
+>>> from gd.admission import AdmissionController
+>>> from gd.sql_connection import SQLConnectionHandler
+>>> controller = AdmissionController(
+...     [('interactive', 8, 0.5), ('batch', 2)], max_in_flight=8)
+>>> lookups = SQLConnectionHandler(
+...     admission=controller, lane='interactive') # doctest: +SKIP
+>>> loader = SQLConnectionHandler(
+...     admission=controller, lane='batch') # doctest: +SKIP
+>>> controller.metrics()['interactive']['wait_max'] # doctest: +SKIP
+0.012
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import division
+from contextlib import contextmanager
+from threading import Condition
+from time import time
+
+from gd.exceptions import GDAdmissionError
+
+
+class AdmissionController(object):
+    """Limits the number of concurrent calls with named priority lanes
+
+    Parameters
+    ----------
+    lanes : list of tuple
+        The lanes, from highest to lowest priority. Each lane is a tuple
+        (name, max_in_flight) or (name, max_in_flight, deadline), where
+        max_in_flight is the maximum number of calls of the lane running at
+        the same time and deadline is the default maximum number of seconds
+        that a call waits to be admitted (None waits indefinitely)
+    max_in_flight : int, optional
+        Maximum number of calls running at the same time across all the
+        lanes. When a call finishes, the waiting calls of the lanes with
+        higher priority are admitted first. Default: no global limit
+
+    Notes
+    -----
+    A call waiting in a lane with higher priority only holds back the calls
+    of lower priority lanes if it could be admitted, i.e. if its own lane is
+    not at its limit.
+    """
+
+    def __init__(self, lanes, max_in_flight=None):
+        self.max_in_flight = max_in_flight
+        self._order = []
+        self._limits = {}
+        self._deadlines = {}
+        self._in_flight = {}
+        self._waiting = {}
+        self._stats = {}
+        for lane in lanes:
+            name, limit = lane[:2]
+            self._order.append(name)
+            self._limits[name] = limit
+            self._deadlines[name] = lane[2] if len(lane) > 2 else None
+            self._in_flight[name] = 0
+            self._waiting[name] = 0
+            self._stats[name] = {'admitted': 0, 'rejected': 0,
+                                 'wait_total': 0.0, 'wait_max': 0.0}
+        self._total = 0
+        self._cond = Condition()
+
+    def _can_admit(self, lane):
+        if self._in_flight[lane] >= self._limits[lane]:
+            return False
+        if self.max_in_flight is None:
+            return True
+        if self._total >= self.max_in_flight:
+            return False
+        # Leave the free slots to the calls of higher priority lanes
+        for other in self._order:
+            if other == lane:
+                return True
+            if (self._waiting[other] and
+                    self._in_flight[other] < self._limits[other]):
+                return False
+        return True
+
+    @contextmanager
+    def admit(self, lane, deadline=None):
+        """Runs the block once the lane has a free slot
+
+        Parameters
+        ----------
+        lane : str
+            The name of the lane
+        deadline : float, optional
+            Maximum number of seconds to wait to be admitted. Defaults to the
+            deadline of the lane
+
+        Raises
+        ------
+        KeyError
+            If the lane does not exist
+        GDAdmissionError
+            If the call is not admitted before the deadline
+        """
+        if lane not in self._limits:
+            raise KeyError("Lane %s does not exist" % lane)
+        if deadline is None:
+            deadline = self._deadlines[lane]
+
+        start = time()
+        with self._cond:
+            stats = self._stats[lane]
+            self._waiting[lane] += 1
+            try:
+                while not self._can_admit(lane):
+                    if deadline is None:
+                        self._cond.wait()
+                        continue
+                    remaining = start + deadline - time()
+                    if remaining <= 0:
+                        stats['rejected'] += 1
+                        raise GDAdmissionError(
+                            "Call not admitted in lane %s after %s seconds"
+                            % (lane, deadline))
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting[lane] -= 1
+                # Calls of lower priority lanes may be waiting for this one
+                self._cond.notify_all()
+            self._in_flight[lane] += 1
+            self._total += 1
+            waited = time() - start
+            stats['admitted'] += 1
+            stats['wait_total'] += waited
+            stats['wait_max'] = max(stats['wait_max'], waited)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight[lane] -= 1
+                self._total -= 1
+                self._cond.notify_all()
+
+    def metrics(self):
+        """Returns the metrics of each lane
+
+        Returns
+        -------
+        dict of {str: dict}
+            The metrics of each lane: 'in_flight' and 'waiting' (the number
+            of calls currently running and waiting), 'admitted' and
+            'rejected' (the number of calls admitted and rejected for
+            exceeding their deadline), 'wait_total', 'wait_mean' and
+            'wait_max' (the time waited by the admitted calls, in seconds)
+        """
+        with self._cond:
+            metrics = {}
+            for lane in self._order:
+                lane_metrics = dict(self._stats[lane])
+                lane_metrics['in_flight'] = self._in_flight[lane]
+                lane_metrics['waiting'] = self._waiting[lane]
+                admitted = lane_metrics['admitted']
+                lane_metrics['wait_mean'] = (
+                    lane_metrics['wait_total'] / admitted if admitted else 0.0)
+                metrics[lane] = lane_metrics
+            return metrics
@@ -0,0 +1,161 @@
+r"""
+Binary COPY encoding (:mod:`gd.binary_copy`)
+============================================
+
+.. currentmodule:: gd.binary_copy
+
+This module encodes columns of fixed-width values (NumPy arrays or any
+object supporting the buffer protocol) in the postgres binary COPY format,
+without creating a Python object per value. It is used by
+:meth:`gd.sql_connection.SQLConnectionHandler.copy_columns`.
+
+Functions
+---------
+
+.. autosummary::
+   :toctree: generated/
+
+   encode_columns
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   ChunkReader
+
+Notes
+-----
+This module requires NumPy.
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Signature, flags field and header extension length
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + b'\x00' * 8
+# Field count of -1
+COPY_TRAILER = b'\xff\xff'
+
+# The big endian wire type for each supported NumPy type kind and size, which
+# must match the type of the table column: bool, int2, int4, int8, float4 or
+# float8
+_WIRE_TYPES = {('b', 1): '?', ('i', 2): '>i2', ('i', 4): '>i4',
+               ('i', 8): '>i8', ('f', 4): '>f4', ('f', 8): '>f8'}
+
+
+def _as_array(values):
+    array = np.asarray(values)
+    if array.ndim != 1:
+        raise ValueError("The columns should be one dimensional")
+    try:
+        wire_type = _WIRE_TYPES[(array.dtype.kind, array.dtype.itemsize)]
+    except KeyError:
+        raise TypeError("Unsupported column type %s. Supported types are "
+                        "bool, int16, int32, int64, float32 and float64"
+                        % array.dtype)
+    return array, np.dtype(wire_type)
+
+
+def encode_columns(columns, chunk_rows=65536):
+    """Encodes columns in the postgres binary COPY format
+
+    Parameters
+    ----------
+    columns : list of array_like
+        The values of each column. All of them must have the same length.
+        They can be NumPy arrays or objects supporting the buffer protocol
+        (e.g. array.array), of boolean, integer or floating point type
+    chunk_rows : int, optional
+        Number of rows encoded in each chunk. Default: 65536
+
+    Returns
+    -------
+    generator of bytes
+        The COPY data: the header, the rows in chunks of `chunk_rows`, and
+        the trailer
+
+    Raises
+    ------
+    ImportError
+        If NumPy is not installed
+    ValueError
+        If the columns have different lengths or are not one dimensional, or
+        if `chunk_rows` is lower than 1
+    TypeError
+        If a column has an unsupported type
+
+    Notes
+    -----
+    The values are copied directly from the column buffers to each encoded
+    chunk through a NumPy record array, so no Python object is created per
+    value. The column buffers themselves are not copied.
+    """
+    if np is None:
+        raise ImportError("NumPy is required to encode binary COPY data")
+    if chunk_rows < 1:
+        raise ValueError("chunk_rows should be at least 1")
+
+    arrays = [_as_array(values) for values in columns]
+    n_rows = len(arrays[0][0]) if arrays else 0
+    if any(len(array) != n_rows for array, _ in arrays):
+        raise ValueError("All the columns should have the same length")
+
+    # Each row is the field count followed by the length and the value of
+    # each field
+    fields = [('count', '>i2')]
+    for pos, (_, wire_type) in enumerate(arrays):
+        fields.append(('length%d' % pos, '>i4'))
+        fields.append(('value%d' % pos, wire_type))
+    row_type = np.dtype(fields)
+
+    return _encode(arrays, n_rows, row_type, chunk_rows)
+
+
+def _encode(arrays, n_rows, row_type, chunk_rows):
+    yield COPY_HEADER
+
+    rows = np.empty(min(chunk_rows, n_rows), dtype=row_type)
+    rows['count'] = len(arrays)
+    for pos, (_, wire_type) in enumerate(arrays):
+        rows['length%d' % pos] = wire_type.itemsize
+
+    for start in range(0, n_rows, chunk_rows):
+        end = min(start + chunk_rows, n_rows)
+        chunk = rows[:end - start]
+        for pos, (array, _) in enumerate(arrays):
+            chunk['value%d' % pos] = array[start:end]
+        yield chunk.tobytes()
+
+    yield COPY_TRAILER
+
+
+class ChunkReader(object):
+    """File-like object reading the chunks produced by a generator
+
+    Parameters
+    ----------
+    chunks : iterable of bytes
+        The chunks of data
+
+    Notes
+    -----
+    Each call to `read` returns a whole chunk, whatever the size requested,
+    which psycopg2's copy_expert sends as it is. This avoids copying the
+    chunks again to split them.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def read(self, size=-1):
+        return next(self._chunks, b'')
@@ -0,0 +1,116 @@
+r"""
+Result cache (:mod:`gd.cache`)
+==============================
+
+.. currentmodule:: gd.cache
+
+This module provides an in-memory cache for query results that can be shared
+by :class:`gd.sql_connection.SQLConnectionHandler` objects.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   ResultCache
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from collections import OrderedDict
+from threading import Lock
+
+
+class ResultCache(object):
+    """Thread-safe least recently used cache of query results
+
+    Parameters
+    ----------
+    max_size : int, optional
+        Maximum number of entries in the cache. Once reached, the least
+        recently used entries are evicted. If None, the cache is unbounded.
+        Default: 10000
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups that found their key in the cache
+    misses : int
+        Number of lookups that did not find their key in the cache
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Returns the value cached for `key`, or `default` if not cached
+
+        Parameters
+        ----------
+        key : hashable
+            The key of the entry
+        default : object, optional
+            The value to return if `key` is not in the cache
+
+        Returns
+        -------
+        object
+        """
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            # Move the entry to the most recently used position
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Caches `value` under `key`
+
+        Parameters
+        ----------
+        key : hashable
+            The key of the entry
+        value : object
+            The value to cache
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            if self.max_size is not None:
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Removes the entry of `key` from the cache, if present
+
+        Parameters
+        ----------
+        key : hashable
+            The key of the entry
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Removes all the entries from the cache"""
+        with self._lock:
+            self._entries.clear()
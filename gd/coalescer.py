@@ -0,0 +1,318 @@
+r"""
+Write coalescer (:mod:`gd.coalescer`)
+=====================================
+
+.. currentmodule:: gd.coalescer
+
+This module provides a buffered writer that groups the single-row writes
+submitted by many threads and flushes them in batches, each batch in a
+single transaction, so the writers do not pay a round-trip and a commit per
+row.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   WriteCoalescer
+   PendingWrite
+
+Examples
+--------
+>>> from gd.coalescer import WriteCoalescer
+>>> coalescer = WriteCoalescer(max_rows=500, max_delay=0.01) # doctest: +SKIP
+>>> pending = coalescer.submit(
+...     "INSERT INTO event (user_id, name) VALUES (%s, %s)",
+...     [42, 'login']) # doctest: +SKIP
+
+The call returns as soon as the row is buffered. Callers that need to know
+that the row has been written wait for it, which raises the error of the row
+if it could not be written:
+
+>>> pending.wait() # doctest: +SKIP
+>>> coalescer.close() # doctest: +SKIP
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from collections import OrderedDict
+from threading import Condition, Event, Thread
+from time import time
+
+from psycopg2.extras import execute_batch
+
+from gd.exceptions import GDBufferFullError, GDError, GDExecutionError
+from gd.sql_connection import SQLConnectionHandler
+
+
+class PendingWrite(object):
+    """A row submitted to a WriteCoalescer
+
+    Attributes
+    ----------
+    sql : str
+        The SQL query
+    sql_args : tuple or list
+        The arguments for the SQL query
+    error : GDError or None
+        The error raised writing the row, once written
+    """
+
+    def __init__(self, sql, sql_args):
+        self.sql = sql
+        self.sql_args = sql_args
+        self.error = None
+        self._done = Event()
+
+    def _set_done(self, error=None):
+        self.error = error
+        self._done.set()
+
+    def done(self):
+        """Whether the row has been written, or has failed"""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Waits until the row has been written
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait. Default: wait indefinitely
+
+        Returns
+        -------
+        bool
+            Whether the row has been written. False if the timeout expired
+
+        Raises
+        ------
+        GDError
+            The error raised writing the row
+        """
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+class WriteCoalescer(object):
+    """Buffers the writes of many threads and flushes them in batches
+
+    The rows are grouped by SQL statement and flushed with
+    psycopg2.extras.execute_batch, all the statements in a single
+    transaction, when `max_rows` rows are buffered, when the oldest buffered
+    row has waited `max_delay` seconds, or when `flush` is called.
+
+    Parameters
+    ----------
+    max_rows : int, optional
+        Number of buffered rows that triggers a flush. Default: 1000
+    max_delay : float, optional
+        Maximum number of seconds a row waits in the buffer. Default: 0.05
+    max_pending : int, optional
+        Maximum number of rows buffered or being written. Once reached,
+        `submit` blocks until there is room (back-pressure). Default: 10000
+    admin : str, optional
+        The admin mode of the coalescer connection. See SQLConnectionHandler
+    profile : str, optional
+        The connection profile of the coalescer connection. Default:
+        'default'
+
+    Notes
+    -----
+    If a batch fails, its rows are written again one by one, each in its own
+    savepoint, so only the failing rows are rejected and the error of each
+    one is reported in its PendingWrite.
+
+    The rows of the same statement are written in submission order, but the
+    order between different statements is not kept.
+    """
+
+    def __init__(self, max_rows=1000, max_delay=0.05, max_pending=10000,
+                 admin='no_admin', profile='default'):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._conn_handler = SQLConnectionHandler(admin=admin,
+                                                  profile=profile)
+        self._cond = Condition()
+        # Buffered rows, grouped by SQL statement
+        self._buffer = OrderedDict()
+        self._buffered = 0
+        # Rows buffered or being written
+        self._pending = 0
+        self._oldest = None
+        self._submitted = 0
+        self._written = 0
+        self._flush_requested = False
+        self._closed = False
+        self._thread = Thread(target=self._run, name='gd-write-coalescer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, sql, sql_args=None, timeout=None):
+        """Buffers a row to be written
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query, e.g. an INSERT of a single row
+        sql_args : tuple or list, optional
+            The arguments for the SQL query
+        timeout : float, optional
+            Maximum number of seconds to wait for room in the buffer.
+            Default: wait indefinitely
+
+        Returns
+        -------
+        PendingWrite
+            The buffered row, to wait until it has been written
+
+        Raises
+        ------
+        ValueError
+            If the coalescer has been closed
+        GDBufferFullError
+            If there is no room in the buffer before the timeout
+        """
+        self._conn_handler._check_sql_args(sql_args)
+        pending = PendingWrite(sql, sql_args)
+        start = time()
+        with self._cond:
+            while self._pending >= self.max_pending and not self._closed:
+                remaining = None if timeout is None else \
+                    start + timeout - time()
+                if remaining is not None and remaining <= 0:
+                    raise GDBufferFullError(
+                        "The write buffer is full after %s seconds"
+                        % timeout)
+                self._cond.wait(remaining)
+            if self._closed:
+                raise ValueError("The coalescer has been closed")
+
+            self._buffer.setdefault(sql, []).append(pending)
+            self._buffered += 1
+            self._pending += 1
+            self._submitted += 1
+            # Wake up the flusher to schedule the flush of the first row, or
+            # to flush the full buffer
+            if self._oldest is None or self._buffered >= self.max_rows:
+                self._cond.notify_all()
+            if self._oldest is None:
+                self._oldest = time()
+        return pending
+
+    def flush(self):
+        """Writes all the rows submitted so far and waits until done"""
+        with self._cond:
+            target = self._submitted
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._written < target:
+                self._cond.wait()
+
+    def close(self):
+        """Writes all the buffered rows and closes the connection"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._conn_handler.close()
+
+    def _next_batch(self):
+        """Waits until a batch should be flushed and takes it"""
+        with self._cond:
+            while True:
+                if self._buffered and (
+                        self._buffered >= self.max_rows or
+                        self._flush_requested or self._closed or
+                        time() - self._oldest >= self.max_delay):
+                    break
+                if not self._buffered:
+                    self._flush_requested = False
+                    if self._closed:
+                        return None
+                    self._cond.wait()
+                else:
+                    self._cond.wait(self._oldest + self.max_delay - time())
+
+            batch = self._buffer
+            self._buffer = OrderedDict()
+            self._buffered = 0
+            self._oldest = None
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._write(batch)
+            written = sum(len(rows) for rows in batch.values())
+            with self._cond:
+                self._pending -= written
+                self._written += written
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        conn_handler = self._conn_handler
+        try:
+            with conn_handler.get_postgres_cursor() as cur:
+                try:
+                    for sql, rows in batch.items():
+                        execute_batch(cur, sql, [r.sql_args for r in rows],
+                                      page_size=self.max_rows)
+                except Exception:
+                    # Either a row failed or it has invalid arguments
+                    conn_handler._connection.rollback()
+                    self._write_rows(cur, batch)
+                else:
+                    conn_handler._connection.commit()
+                    for rows in batch.values():
+                        for row in rows:
+                            row._set_done()
+        except Exception as e:
+            # The connection failed, so none of the remaining rows has been
+            # written. Discard the rows already run in the transaction, so
+            # they are not committed by the next batch
+            try:
+                conn_handler._connection.rollback()
+            except Exception:
+                pass
+            if not isinstance(e, GDError):
+                e = GDExecutionError("Error writing the batch: %s" % e)
+            for rows in batch.values():
+                for row in rows:
+                    if not row.done():
+                        row._set_done(e)
+
+    def _write_rows(self, cur, batch):
+        """Writes the rows one by one, rejecting only the failing ones"""
+        results = []
+        for sql, rows in batch.items():
+            for row in rows:
+                cur.execute("SAVEPOINT gd_coalescer")
+                try:
+                    cur.execute(sql, row.sql_args)
+                except Exception as e:
+                    # Either the row failed or it has invalid arguments, e.g.
+                    # psycopg2 raises ValueError for a bad format string
+                    cur.execute("ROLLBACK TO SAVEPOINT gd_coalescer")
+                    results.append((row, GDExecutionError(
+                        "\nError running SQL query: %s\nARGS: %s\nError: %s"
+                        % (sql, str(row.sql_args), e))))
+                else:
+                    cur.execute("RELEASE SAVEPOINT gd_coalescer")
+                    results.append((row, None))
+        self._conn_handler._connection.commit()
+        for row, error in results:
+            row._set_done(error)
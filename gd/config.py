@@ -13,9 +13,68 @@ with standard_library.hooks():
     from configparser import ConfigParser
 
 
+class GDProfile(object):
+    """Holds the connection settings of a postgres profile
+
+    Attributes
+    ----------
+    name : str
+        The name of the profile
+    user : str
+        The postgres user to connect to the postgres server
+    password : str
+        The password for the previous user
+    database : str
+        The database to connect to
+    host : str
+        The host where the postgres server lives
+    port : int
+        The port to use to connect to the postgres server
+    admin_user : str
+        The administrator user to connect to the postgres server
+    admin_password : str
+        The password for the administrator user
+    pool_min_size : int
+        The number of idle connections kept open in the profile pool
+    pool_max_size : int
+        The maximum number of connections of the profile pool. If 0, the
+        connections of the profile are not pooled
+    """
+
+    def __init__(self, name, config, section, defaults=None):
+        self.name = name
+
+        def get(option, default=None):
+            # Options not present in a named profile are taken from the
+            # default profile
+            if config.has_option(section, option):
+                return config.get(section, option)
+            if defaults is not None:
+                return getattr(defaults, option.lower())
+            if default is not None:
+                return default
+            # Let the config parser raise the error for the missing option
+            return config.get(section, option)
+
+        self.user = get('USER')
+        self.password = get('PASSWORD') or None
+        self.database = get('DATABASE')
+        self.host = get('HOST')
+        self.port = int(get('PORT'))
+        self.admin_user = get('ADMIN_USER') or None
+        self.admin_password = get('ADMIN_PASSWORD') or None
+        self.pool_min_size = int(get('POOL_MIN_SIZE', '0') or 0)
+        self.pool_max_size = int(get('POOL_MAX_SIZE', '0') or 0)
+
+
 class GDConfig(object):
     """Holds the glowing-dangerzone configuration
 
+    The connection settings are read from the `[postgres]` section, which
+    defines the 'default' profile. Additional profiles are defined in
+    `[postgres:<name>]` sections; any option missing in them is taken from
+    the default profile.
+
     Attributes
     ----------
     user : str
@@ -32,6 +91,17 @@ class GDConfig(object):
         The administrator user to connect to the postgres server
     admin_password : str
         The password for the administrator user
+    profiles : dict of {str: GDProfile}
+        The connection profiles, keyed by name. The attributes above are the
+        ones of the 'default' profile
+    shards : list of str
+        The names of the profiles of the shard nodes, in shard order, from
+        the SHARDS option of the `[sharding]` section. Empty if there is no
+        such section
+    sessions : dict of {str: dict of {str: str}}
+        The session profiles, keyed by name, from the `[session:<name>]`
+        sections. Each one holds the values of the postgres settings (e.g.
+        work_mem) applied to the calls that use the profile
     """
 
     def __init__(self):
@@ -47,13 +117,38 @@ class GDConfig(object):
         with open(conf_fp) as f:
             config.readfp(f)
 
-        self.user = config.get('postgres', 'USER')
-        self.password = config.get('postgres', 'PASSWORD') or None
-        self.database = config.get('postgres', 'DATABASE')
-        self.host = config.get('postgres', 'HOST')
-        self.port = config.getint('postgres', 'PORT')
-        self.admin_user = config.get('postgres', 'ADMIN_USER') or None
-        self.admin_password = config.get('postgres', 'ADMIN_PASSWORD') or None
+        default = GDProfile('default', config, 'postgres')
+        self.profiles = {'default': default}
+        for section in config.sections():
+            if section.startswith('postgres:'):
+                name = section[len('postgres:'):]
+                self.profiles[name] = GDProfile(name, config, section,
+                                                defaults=default)
+
+        self.sessions = {}
+        for section in config.sections():
+            if section.startswith('session:'):
+                name = section[len('session:'):]
+                # The option names are lower cased, as postgres settings
+                self.sessions[name] = dict(config.items(section, raw=True))
+
+        self.shards = []
+        if config.has_option('sharding', 'SHARDS'):
+            self.shards = [name.strip() for name in
+                           config.get('sharding', 'SHARDS').split(',')
+                           if name.strip()]
+            for name in self.shards:
+                if name not in self.profiles:
+                    raise ValueError("The shard profile %s is not defined"
+                                     % name)
+
+        self.user = default.user
+        self.password = default.password
+        self.database = default.database
+        self.host = default.host
+        self.port = default.port
+        self.admin_user = default.admin_user
+        self.admin_password = default.admin_password
 
 
 gd_config = GDConfig()
@@ -0,0 +1,358 @@
+r"""
+Disk cache (:mod:`gd.disk_cache`)
+=================================
+
+.. currentmodule:: gd.disk_cache
+
+This module provides an on-disk cache of query results stored by column in
+NumPy `.npy` files, so the results of expensive queries can be reused across
+processes and sessions without running them again. Cached columns are memory
+mapped when read, so opening a result does not copy it.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   DiskCache
+
+Functions
+---------
+
+.. autosummary::
+   :toctree: generated/
+
+   to_columns
+
+Examples
+--------
+>>> from gd.disk_cache import DiskCache
+>>> from gd.sql_connection import SQLConnectionHandler
+>>> cache = DiskCache('/tmp/gd_cache', max_bytes=10 * 2**30)
+>>> conn_handler = SQLConnectionHandler(disk_cache=cache) # doctest: +SKIP
+>>> columns = conn_handler.execute_fetch_columns(
+...     "SELECT day, SUM(amount) AS total FROM sale GROUP BY day",
+...     use_cache=True, version='2014-10-01') # doctest: +SKIP
+>>> columns['total'].mean() # doctest: +SKIP
+
+Other processes can open the cached result without connecting to postgres:
+
+>>> DiskCache('/tmp/gd_cache').get(
+...     "SELECT day, SUM(amount) AS total FROM sale GROUP BY day",
+...     version='2014-10-01') # doctest: +SKIP
+
+Notes
+-----
+This module requires NumPy.
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from collections import OrderedDict
+from datetime import date, datetime
+from hashlib import sha1
+from json import dumps, loads
+from os import listdir, makedirs, rename, utime
+from os.path import getmtime, getsize, isdir, join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Prefix of the directories of the entries being written
+_TMP_PREFIX = '.tmp-'
+
+
+def _to_array(values):
+    nulls = [value is None for value in values]
+    present = [value for value in values if value is not None]
+    if not present:
+        # Only NULLs: any type will do
+        return np.ma.masked_array(np.zeros(len(values), dtype=bool),
+                                  mask=np.ones(len(values), dtype=bool))
+
+    if len(present) < len(values):
+        # Fill the NULLs with a value of the same type, and mask them
+        fill = present[0]
+        values = [fill if null else value
+                  for value, null in zip(values, nulls)]
+
+    if all(isinstance(value, datetime) for value in present):
+        array = np.array(values, dtype='datetime64[us]')
+    elif all(isinstance(value, date) for value in present):
+        array = np.array(values, dtype='datetime64[D]')
+    elif any(isinstance(value, (list, tuple)) for value in present):
+        # Postgres arrays: NumPy would build a multidimensional array from
+        # them, or fail if their lengths differ
+        array = np.empty(len(values), dtype=object)
+        for pos, value in enumerate(values):
+            array[pos] = value
+    else:
+        array = np.asarray(values)
+
+    if len(present) < len(nulls):
+        return np.ma.masked_array(array, mask=np.array(nulls, dtype=bool))
+    return array
+
+
+def to_columns(names, rows):
+    """Converts rows to NumPy arrays, one per column
+
+    Parameters
+    ----------
+    names : list of str
+        The names of the columns
+    rows : list of tuples
+        The rows, with their values in the order of `names`
+
+    Returns
+    -------
+    OrderedDict of {str: numpy.ndarray}
+        The values of each column. Numbers, booleans and strings are
+        converted to arrays of their type, and dates and datetimes to
+        datetime64 arrays. Columns with NULLs are masked arrays, masking
+        them. Values of other types (e.g. Decimal, or lists from array
+        columns) are kept in one-dimensional object arrays
+
+    Raises
+    ------
+    ImportError
+        If NumPy is not installed
+    """
+    if np is None:
+        raise ImportError("NumPy is required to convert rows to columns")
+
+    columns = OrderedDict()
+    for pos, name in enumerate(names):
+        columns[name] = _to_array([row[pos] for row in rows])
+    return columns
+
+
+class DiskCache(object):
+    """On-disk least recently used cache of columnar query results
+
+    Each result is stored in its own directory, with one `.npy` file per
+    column (plus one with the NULL mask of the columns that have NULLs) and
+    a `meta.json` file with the column names. The results are keyed by their
+    SQL query, arguments and an optional version token, e.g. the date of the
+    last load of the tables queried.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the cache. It is created if it does not exist
+    max_bytes : int, optional
+        Maximum size of the files of the cache, in bytes. Once exceeded, the
+        least recently used results are evicted. If None, the cache is
+        unbounded. Default: 1 GiB
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups, by this object, that found their result
+    misses : int
+        Number of lookups, by this object, that did not find their result
+
+    Raises
+    ------
+    ImportError
+        If NumPy is not installed
+
+    Notes
+    -----
+    The cache can be shared by several processes: the results are written to
+    a temporary directory that is renamed once complete, so readers never
+    see partial results. Evicting a result does not affect the processes
+    that have it memory mapped.
+    """
+
+    def __init__(self, directory, max_bytes=2**30):
+        if np is None:
+            raise ImportError("NumPy is required to use the disk cache")
+        if not isdir(directory):
+            makedirs(directory)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, sql, sql_args=None, version=None):
+        """Returns the key of a result
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query
+        sql_args : tuple, list or dict, optional
+            The arguments for the SQL query
+        version : str, optional
+            The version token of the result
+
+        Returns
+        -------
+        str
+            The name of the directory of the result
+        """
+        if isinstance(sql_args, tuple):
+            sql_args = list(sql_args)
+        entry = dumps([sql, sql_args, version], default=str, sort_keys=True)
+        return sha1(entry.encode('utf-8')).hexdigest()
+
+    def get(self, sql, sql_args=None, version=None):
+        """Returns a cached result, or None if not cached
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query
+        sql_args : tuple, list or dict, optional
+            The arguments for the SQL query
+        version : str, optional
+            The version token of the result
+
+        Returns
+        -------
+        OrderedDict of {str: numpy.ndarray} or None
+            The read-only, memory mapped, values of each column, as returned
+            by `to_columns`
+        """
+        path = join(self.directory, self.key(sql, sql_args, version))
+        try:
+            with open(join(path, 'meta.json')) as f:
+                meta = loads(f.read())
+            # Empty files cannot be memory mapped
+            mmap_mode = 'r' if meta['rows'] else None
+            columns = OrderedDict()
+            for pos, column in enumerate(meta['columns']):
+                values = np.load(join(path, '%d.npy' % pos),
+                                 mmap_mode=mmap_mode)
+                if column['nulls']:
+                    mask = np.load(join(path, '%d.nulls.npy' % pos),
+                                   mmap_mode=mmap_mode)
+                    values = np.ma.masked_array(values, mask=mask)
+                columns[column['name']] = values
+        except (IOError, OSError, ValueError):
+            # Not cached, or evicted while reading it
+            self.misses += 1
+            return None
+
+        try:
+            # Mark the result as recently used
+            utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return columns
+
+    def put(self, sql, sql_args, columns, version=None):
+        """Caches a result
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query
+        sql_args : tuple, list or dict
+            The arguments for the SQL query
+        columns : OrderedDict of {str: numpy.ndarray}
+            The values of each column, as returned by `to_columns`
+        version : str, optional
+            The version token of the result
+
+        Returns
+        -------
+        bool
+            Whether the result has been cached. Results with object columns,
+            which cannot be memory mapped, or larger than `max_bytes` are
+            not cached, nor are results whose files could not be written
+        """
+        arrays = [np.ma.getdata(values) for values in columns.values()]
+        if any(array.dtype.hasobject for array in arrays):
+            return False
+        size = sum(array.nbytes for array in arrays)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+
+        tmp_path = mkdtemp(prefix=_TMP_PREFIX, dir=self.directory)
+        try:
+            meta = {'sql': sql, 'rows': len(arrays[0]) if arrays else 0,
+                    'columns': []}
+            for pos, (name, values) in enumerate(columns.items()):
+                np.save(join(tmp_path, '%d.npy' % pos), np.ma.getdata(values))
+                nulls = np.ma.is_masked(values)
+                if nulls:
+                    np.save(join(tmp_path, '%d.nulls.npy' % pos),
+                            np.ma.getmaskarray(values))
+                meta['columns'].append({'name': name, 'nulls': nulls})
+            with open(join(tmp_path, 'meta.json'), 'w') as f:
+                f.write(dumps(meta, default=str))
+
+            path = join(self.directory, self.key(sql, sql_args, version))
+            rmtree(path, ignore_errors=True)
+            rename(tmp_path, path)
+        except OSError:
+            # Another process cached the same result in the meantime, or the
+            # files could not be written
+            rmtree(tmp_path, ignore_errors=True)
+            return False
+
+        self._evict()
+        return True
+
+    def invalidate(self, sql, sql_args=None, version=None):
+        """Removes a result from the cache, if cached
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query
+        sql_args : tuple, list or dict, optional
+            The arguments for the SQL query
+        version : str, optional
+            The version token of the result
+        """
+        rmtree(join(self.directory, self.key(sql, sql_args, version)),
+               ignore_errors=True)
+
+    def clear(self):
+        """Removes all the results from the cache"""
+        for name in listdir(self.directory):
+            if not name.startswith(_TMP_PREFIX):
+                rmtree(join(self.directory, name), ignore_errors=True)
+
+    def size(self):
+        """Returns the size of the files of the cache, in bytes"""
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        """Returns the path, last use and size of each cached result"""
+        entries = []
+        for name in listdir(self.directory):
+            if name.startswith(_TMP_PREFIX):
+                continue
+            path = join(self.directory, name)
+            try:
+                size = sum(getsize(join(path, f)) for f in listdir(path))
+                entries.append((path, getmtime(path), size))
+            except OSError:
+                # Evicted by another process
+                pass
+        return entries
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            rmtree(path, ignore_errors=True)
+            total -= size
@@ -20,3 +20,23 @@ class GDConnectionError(GDError):
 class GDExecutionError(GDError):
     """Exception for error when executing SQL queries"""
     pass
+
+
+class GDTimeoutError(GDExecutionError):
+    """Exception for SQL queries cancelled for exceeding their timeout"""
+    pass
+
+
+class GDResultSizeError(GDExecutionError):
+    """Exception for SQL query results exceeding their size limits"""
+    pass
+
+
+class GDAdmissionError(GDError):
+    """Exception for calls not admitted to run before their deadline"""
+    pass
+
+
+class GDBufferFullError(GDError):
+    """Exception for writes not buffered for lack of room before a timeout"""
+    pass
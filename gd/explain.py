@@ -0,0 +1,208 @@
+r"""
+Query plan sampling (:mod:`gd.explain`)
+=======================================
+
+.. currentmodule:: gd.explain
+
+This module provides an opt-in sampler that captures the execution plan of
+the queries run through a :class:`gd.sql_connection.SQLConnectionHandler`,
+so slow paths can be analyzed after the fact.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   ExplainSampler
+
+Examples
+--------
+Capture the plan of every call taking more than half a second and of 1% of
+the remaining calls:
+
+>>> from gd.explain import ExplainSampler
+>>> from gd.sql_connection import SQLConnectionHandler
+>>> sampler = ExplainSampler(sample_rate=0.01, threshold=0.5)
+>>> conn_handler = SQLConnectionHandler(
+...     explain_sampler=sampler) # doctest: +SKIP
+>>> conn_handler.execute_fetchall(
+...     "SELECT * FROM user WHERE name = %s", ['Toy']) # doctest: +SKIP
+>>> sampler.seq_scan_report(min_rows=10000) # doctest: +SKIP
+[{'sql': 'SELECT * FROM user WHERE name = %s', 'relation': 'user',
+  'rows': 250000, 'samples': 1, 'duration': 0.72}] # doctest: +SKIP
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import division
+from collections import deque
+from random import random
+from re import compile as re_compile, IGNORECASE
+
+from psycopg2.sql import Composable
+
+# The statements sampled: those accepted by the read-only detection of
+# SQLConnectionHandler, but SHOW, which cannot be explained
+_SAMPLED_SQL = re_compile(r'\s*(\(\s*)*(SELECT|VALUES|TABLE)\b', IGNORECASE)
+
+
+def _walk_plan(node):
+    """Yields all the nodes of an EXPLAIN (FORMAT JSON) plan tree"""
+    yield node
+    for child in node.get('Plans', []):
+        for descendant in _walk_plan(child):
+            yield descendant
+
+
+class ExplainSampler(object):
+    """Captures the plans of a sample of the SQL queries run by a handler
+
+    Parameters
+    ----------
+    sample_rate : float, optional
+        Fraction of the calls whose plan is captured. Default: 0
+    threshold : float, optional
+        Calls taking at least this number of seconds always have their plan
+        captured. Default: no threshold
+    max_plans : int, optional
+        Maximum number of plans kept. Once reached, the oldest plans are
+        discarded. Default: 1000
+
+    Attributes
+    ----------
+    plans : collections.deque of dict
+        The captured plans. Each plan is a dict with the keys 'sql',
+        'sql_args', 'duration' (in seconds, of the original call), 'plan'
+        (the output of EXPLAIN in JSON format or None if it could not be
+        captured) and 'error' (None or the error raised by EXPLAIN)
+
+    Notes
+    -----
+    The plans are captured with EXPLAIN (ANALYZE, BUFFERS), so the query is
+    executed a second time. Only plain SELECT, VALUES and TABLE queries are
+    sampled, as the side effects of other statements, e.g. sequence
+    increments, cannot be undone. They are also run inside a savepoint that
+    is rolled back afterwards, for the SELECTs calling functions that write,
+    but the side effects not undone by a rollback (e.g. nextval) happen
+    twice. The handler captures the plan once the timeout of the call no
+    longer applies, so it cannot be cancelled midway.
+
+    Queries composed with psycopg2.sql are not sampled, nor are the calls to
+    `executemany` and `execute_queue`, whose statements depend on each
+    other.
+    """
+
+    def __init__(self, sample_rate=0.0, threshold=None, max_plans=1000):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.plans = deque(maxlen=max_plans)
+
+    def should_explain(self, duration):
+        """Whether the plan of a call taking `duration` should be captured
+
+        Parameters
+        ----------
+        duration : float
+            The number of seconds the call took
+
+        Returns
+        -------
+        bool
+        """
+        if self.threshold is not None and duration >= self.threshold:
+            return True
+        return self.sample_rate > 0 and random() < self.sample_rate
+
+    def explain(self, cursor, sql, sql_args, duration):
+        """Captures the plan of an SQL query
+
+        Parameters
+        ----------
+        cursor : psycopg2.cursor
+            The cursor in which the SQL query was executed. The plan is
+            captured in the same transaction
+        sql : str
+            The SQL query
+        sql_args : tuple or list
+            The arguments for the SQL query
+        duration : float
+            The number of seconds that the original call took
+
+        Notes
+        -----
+        Errors are never raised, so sampling cannot fail the call: they are
+        recorded in the 'error' key of the plan instead. The queries that are
+        not sampled (see the class Notes) are ignored
+        """
+        if isinstance(sql, Composable) or not _SAMPLED_SQL.match(sql):
+            return
+
+        plan = error = None
+        try:
+            in_transaction = not cursor.connection.autocommit
+            cursor.execute("SAVEPOINT gd_explain" if in_transaction
+                           else "BEGIN")
+            try:
+                cursor.execute(
+                    "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, sql_args)
+                plan = cursor.fetchone()[0][0]
+            except Exception as e:
+                error = str(e)
+            cursor.execute("ROLLBACK TO SAVEPOINT gd_explain" if in_transaction
+                           else "ROLLBACK")
+        except Exception as e:
+            error = str(e)
+
+        self.plans.append({'sql': sql, 'sql_args': sql_args,
+                           'duration': duration, 'plan': plan,
+                           'error': error})
+
+    def seq_scan_report(self, min_rows=10000):
+        """Reports the statements whose plans scan sequentially large tables
+
+        Parameters
+        ----------
+        min_rows : int, optional
+            Minimum number of rows read by a sequential scan for it to be
+            reported. Default: 10000
+
+        Returns
+        -------
+        list of dict
+            One dict for each statement and scanned table, with the keys
+            'sql', 'relation', 'rows' (the maximum number of rows read in a
+            single call), 'samples' (the number of captured plans with the
+            sequential scan) and 'duration' (the maximum duration of those
+            calls), sorted by decreasing number of rows
+        """
+        report = {}
+        for entry in self.plans:
+            if entry['plan'] is None:
+                continue
+            for node in _walk_plan(entry['plan']['Plan']):
+                if node['Node Type'] != 'Seq Scan':
+                    continue
+                rows = ((node.get('Actual Rows', 0) +
+                         node.get('Rows Removed by Filter', 0)) *
+                        node.get('Actual Loops', 1))
+                if rows < min_rows:
+                    continue
+                key = (entry['sql'], node['Relation Name'])
+                if key not in report:
+                    report[key] = {'sql': key[0], 'relation': key[1],
+                                   'rows': 0, 'samples': 0, 'duration': 0}
+                stats = report[key]
+                stats['rows'] = max(stats['rows'], rows)
+                stats['samples'] += 1
+                stats['duration'] = max(stats['duration'], entry['duration'])
+
+        return sorted(report.values(), key=lambda s: s['rows'], reverse=True)
+
+    def clear(self):
+        """Discards all the captured plans"""
+        self.plans.clear()
@@ -0,0 +1,289 @@
+r"""
+Notification listener (:mod:`gd.listener`)
+==========================================
+
+.. currentmodule:: gd.listener
+
+This module provides a listener for the postgres LISTEN/NOTIFY mechanism, so
+processes can react to the changes done by other processes, e.g. to evict
+stale entries from a :class:`gd.cache.ResultCache`.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   NotificationListener
+
+Examples
+--------
+Evict the cached users whenever a process notifies a change on the 'users'
+channel, with the id of the changed user as payload:
+
+>>> from gd.cache import ResultCache
+>>> from gd.listener import NotificationListener
+>>> from gd.sql_connection import SQLConnectionHandler
+>>> cache = ResultCache()
+>>> listener = NotificationListener() # doctest: +SKIP
+>>> sql = "SELECT id, name FROM user WHERE id = ANY(%s)"
+>>> listener.invalidate_on(
+...     'users', cache, key=lambda payload: (sql, int(payload))
+...     ) # doctest: +SKIP
+>>> listener.start() # doctest: +SKIP
+
+And in any other process:
+
+>>> conn_handler = SQLConnectionHandler() # doctest: +SKIP
+>>> conn_handler.execute(
+...     "SELECT pg_notify(%s, %s)", ['users', '42']) # doctest: +SKIP
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from logging import getLogger
+from os import pipe, read, write, close
+from select import select
+from threading import RLock, Thread
+
+from psycopg2 import sql as pgsql, Error as PostgresError
+
+from gd.disk_cache import DiskCache
+from gd.exceptions import GDConnectionError
+from gd.sql_connection import SQLConnectionHandler
+
+logger = getLogger(__name__)
+
+
+class NotificationListener(object):
+    """Dispatches the notifications of postgres channels to callbacks
+
+    The listener uses its own connection, so the notifications are received
+    even while other handlers of the process are running queries.
+    Notifications are dispatched either from a background thread, started
+    with `start`, or from an asyncio event loop, with `attach`. In both cases
+    the listener waits on the connection socket, so it does not poll the
+    server.
+
+    If the connection profile has a pool, the listener holds one of its
+    connections until `close` is called, so the pool should be sized with
+    the listeners in mind.
+
+    Parameters
+    ----------
+    admin : str, optional
+        The admin mode of the listener connection. See SQLConnectionHandler
+    profile : str, optional
+        The connection profile of the listener connection. Default: 'default'
+
+    Attributes
+    ----------
+    error : Exception or None
+        The error that stopped the background thread, if any
+    """
+
+    def __init__(self, admin='no_admin', profile='default'):
+        self._conn_handler = SQLConnectionHandler(admin=admin,
+                                                  profile=profile)
+        self._conn_handler.autocommit = True
+        self._connection = self._conn_handler._connection
+        self._callbacks = {}
+        self._lock = RLock()
+        self._thread = None
+        self._wakeup = None
+        self.error = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except AttributeError:
+            # There was an issue initializing the listener
+            pass
+
+    def _execute(self, sql):
+        with self._lock:
+            try:
+                with self._connection.cursor() as cur:
+                    cur.execute(sql)
+            except PostgresError as e:
+                raise GDConnectionError("Error running query: %s" % e)
+
+    def subscribe(self, channel, callback):
+        """Calls `callback` with each notification sent to `channel`
+
+        Parameters
+        ----------
+        channel : str
+            The name of the channel
+        callback : callable
+            Function called with the psycopg2.extensions.Notify object of
+            each notification, which has the attributes `channel`, `payload`
+            and `pid` (the process id of the sender backend)
+        """
+        with self._lock:
+            if channel not in self._callbacks:
+                self._execute(pgsql.SQL("LISTEN {}").format(
+                    pgsql.Identifier(channel)))
+                self._callbacks[channel] = []
+            self._callbacks[channel].append(callback)
+
+    def unsubscribe(self, channel, callback=None):
+        """Stops calling `callback` with the notifications of `channel`
+
+        Parameters
+        ----------
+        channel : str
+            The name of the channel
+        callback : callable, optional
+            The callback to remove. If not provided, all the callbacks of the
+            channel are removed
+
+        Raises
+        ------
+        KeyError
+            If the listener is not subscribed to the channel
+        """
+        with self._lock:
+            callbacks = self._callbacks[channel]
+            if callback is not None:
+                callbacks.remove(callback)
+            if callback is None or not callbacks:
+                del self._callbacks[channel]
+                self._execute(pgsql.SQL("UNLISTEN {}").format(
+                    pgsql.Identifier(channel)))
+
+    def invalidate_on(self, channel, cache, key=None):
+        """Evicts entries of `cache` on each notification sent to `channel`
+
+        Parameters
+        ----------
+        channel : str
+            The name of the channel
+        cache : gd.cache.ResultCache or gd.disk_cache.DiskCache
+            The cache whose entries are evicted
+        key : callable, optional
+            Function that returns the key of the entry to evict from the
+            notification payload. For a DiskCache, the key is the tuple of
+            the `sql`, `sql_args` and `version` of the result, as passed to
+            DiskCache.invalidate. If not provided, or if the payload is
+            empty, the whole cache is cleared
+
+        Returns
+        -------
+        callable
+            The callback subscribed to the channel, to use in `unsubscribe`
+        """
+        def callback(notify):
+            if key is None or not notify.payload:
+                cache.clear()
+            elif isinstance(cache, DiskCache):
+                cache.invalidate(*key(notify.payload))
+            else:
+                cache.invalidate(key(notify.payload))
+
+        self.subscribe(channel, callback)
+        return callback
+
+    def dispatch(self):
+        """Dispatches the notifications received so far to their callbacks
+
+        Notes
+        -----
+        It does not block, so it can be called whenever the connection socket
+        (available through `fileno`) is readable.
+        """
+        with self._lock:
+            self._connection.poll()
+            notifies = list(self._connection.notifies)
+            del self._connection.notifies[:]
+            callbacks = dict((channel, list(cbs))
+                             for channel, cbs in self._callbacks.items())
+
+        for notify in notifies:
+            for callback in callbacks.get(notify.channel, []):
+                try:
+                    callback(notify)
+                except Exception:
+                    logger.exception("Error in the callback of a notification"
+                                     " on channel %s", notify.channel)
+
+    def fileno(self):
+        """Returns the file descriptor of the listener connection"""
+        return self._connection.fileno()
+
+    def attach(self, loop):
+        """Dispatches the notifications from an asyncio event loop
+
+        Parameters
+        ----------
+        loop : asyncio.AbstractEventLoop
+            The event loop. Callbacks are run in the loop thread
+        """
+        loop.add_reader(self.fileno(), self.dispatch)
+
+    def detach(self, loop):
+        """Stops dispatching the notifications from an asyncio event loop
+
+        Parameters
+        ----------
+        loop : asyncio.AbstractEventLoop
+            The event loop passed to `attach`
+        """
+        loop.remove_reader(self.fileno())
+
+    def start(self):
+        """Dispatches the notifications from a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.error = None
+        self._wakeup = pipe()
+        self._thread = Thread(target=self._run, args=(self._wakeup[0],),
+                              name='gd-notification-listener')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background thread started with `start`"""
+        if self._thread is None:
+            return
+        write(self._wakeup[1], b'x')
+        self._thread.join()
+        for fd in self._wakeup:
+            close(fd)
+        self._thread = self._wakeup = None
+
+    def close(self):
+        """Stops the listener and closes its connection
+
+        The listener stops listening to all its channels first, so a pooled
+        connection is not returned to the pool still receiving their
+        notifications
+        """
+        self.stop()
+        with self._lock:
+            self._callbacks.clear()
+            if self._connection is not None and not self._connection.closed:
+                try:
+                    self._execute("UNLISTEN *")
+                except GDConnectionError:
+                    # The connection is lost, so it is not listening either
+                    pass
+            self._conn_handler.close()
+            self._connection = None
+
+    def _run(self, wakeup):
+        try:
+            while True:
+                readable = select([self._connection, wakeup], [], [])[0]
+                if wakeup in readable:
+                    read(wakeup, 1)
+                    return
+                self.dispatch()
+        except Exception as e:
+            # The connection has been lost, there is nothing else to listen
+            logger.exception("The notification listener stopped")
+            self.error = e
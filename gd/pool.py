@@ -0,0 +1,79 @@
+r"""
+Connection pools (:mod:`gd.pool`)
+=================================
+
+.. currentmodule:: gd.pool
+
+This module keeps one connection pool per connection profile and admin mode,
+so all the :class:`gd.sql_connection.SQLConnectionHandler` objects of a
+process connecting with the same profile share their connections.
+
+Functions
+---------
+
+.. autosummary::
+   :toctree: generated/
+
+   get_pool
+   close_pools
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from threading import Lock
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from gd.exceptions import GDConnectionError
+
+_pools = {}
+_pools_lock = Lock()
+
+
+def get_pool(key, min_size, max_size, connection_args):
+    """Returns the connection pool for `key`, creating it if needed
+
+    Parameters
+    ----------
+    key : hashable
+        The key identifying the pool, e.g. the profile name and admin mode
+    min_size : int
+        The number of idle connections kept open in the pool
+    max_size : int
+        The maximum number of connections of the pool
+    connection_args : dict
+        The arguments passed to psycopg2.connect to open new connections
+
+    Returns
+    -------
+    psycopg2.pool.ThreadedConnectionPool
+
+    Raises
+    ------
+    GDConnectionError
+        If the pool cannot be created
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            try:
+                pool = ThreadedConnectionPool(min_size, max_size,
+                                              **connection_args)
+            except Exception as e:
+                raise GDConnectionError(
+                    "Cannot connect to database: %s" % str(e))
+            _pools[key] = pool
+        return pool
+
+
+def close_pools():
+    """Closes all the connection pools and their connections"""
+    with _pools_lock:
+        for pool in _pools.values():
+            if not pool.closed:
+                pool.closeall()
+        _pools.clear()
@@ -0,0 +1,265 @@
+r"""
+Sharded connection handler (:mod:`gd.sharding`)
+===============================================
+
+.. currentmodule:: gd.sharding
+
+This module provides a handler for tables split by a shard key (e.g. a
+tenant id) across several postgres nodes. Each call is routed to the node
+holding its shard key, and queries can also be run on all the nodes in
+parallel, merging their results.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   ShardedConnectionHandler
+
+Examples
+--------
+The nodes are configured as profiles listed in the `[sharding]` section of
+the gd configuration:
+
+>>> from gd.sharding import ShardedConnectionHandler
+>>> conn_handler = ShardedConnectionHandler() # doctest: +SKIP
+>>> conn_handler.execute(
+...     tenant_id, "INSERT INTO event (tenant_id, name) VALUES (%s, %s)",
+...     [tenant_id, 'login']) # doctest: +SKIP
+>>> conn_handler.execute_fetchall(
+...     tenant_id, "SELECT * FROM event WHERE tenant_id = %s",
+...     [tenant_id]) # doctest: +SKIP
+>>> conn_handler.scatter_fetchall(
+...     "SELECT tenant_id, COUNT(*) FROM event GROUP BY tenant_id"
+...     ) # doctest: +SKIP
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from threading import Thread
+from zlib import crc32
+
+from gd import gd_config
+from gd.exceptions import GDConnectionError
+from gd.sql_connection import SQLConnectionHandler, _TEXT_TYPES
+
+
+class ShardedConnectionHandler(object):
+    """Routes the SQL queries to the postgres node holding each shard key
+
+    Parameters
+    ----------
+    shards : list of str, optional
+        The names of the profiles of the shard nodes, in shard order.
+        Default: the shards of the gd configuration
+    admin : str, optional
+        The admin mode of the connections. See SQLConnectionHandler
+    timeout : float, optional
+        The default timeout of the calls. See SQLConnectionHandler
+    session : str, optional
+        The session profile applied to the connections of all the nodes. See
+        SQLConnectionHandler
+
+    Attributes
+    ----------
+    handlers : list of SQLConnectionHandler
+        The handler of each shard node. Nodes whose profile has a connection
+        pool take their connection from it
+
+    Raises
+    ------
+    GDConnectionError
+        If there are no shards or cannot connect to any of them
+
+    Notes
+    -----
+    The node of a shard key is chosen with the CRC32 of its string
+    representation, so it is stable across processes but changes if the
+    number of shards changes.
+
+    As SQLConnectionHandler, this handler should not be shared by several
+    threads.
+    """
+
+    def __init__(self, shards=None, admin='no_admin', timeout=None,
+                 session=None):
+        if shards is None:
+            shards = gd_config.shards
+        if not shards:
+            raise GDConnectionError("No shards have been configured")
+
+        self.shards = list(shards)
+        self.handlers = []
+        try:
+            for profile in self.shards:
+                self.handlers.append(SQLConnectionHandler(
+                    admin=admin, profile=profile, timeout=timeout,
+                    session=session))
+        except GDConnectionError:
+            self.close()
+            raise
+
+    def close(self):
+        """Closes the connections of all the shard nodes"""
+        for conn_handler in self.handlers:
+            conn_handler.close()
+
+    def shard_for(self, shard_key):
+        """Returns the position of the shard node holding `shard_key`
+
+        Parameters
+        ----------
+        shard_key : object
+            The shard key, e.g. the tenant id. Text keys are hashed as UTF-8,
+            and other keys by their string representation
+
+        Returns
+        -------
+        int
+        """
+        key = shard_key if isinstance(shard_key, _TEXT_TYPES) \
+            else str(shard_key)
+        if not isinstance(key, bytes):
+            key = key.encode('utf-8')
+        digest = crc32(key) & 0xffffffff
+        return digest % len(self.handlers)
+
+    def handler_for(self, shard_key):
+        """Returns the handler of the shard node holding `shard_key`
+
+        Parameters
+        ----------
+        shard_key : object
+            The shard key, e.g. the tenant id
+
+        Returns
+        -------
+        SQLConnectionHandler
+        """
+        return self.handlers[self.shard_for(shard_key)]
+
+    def execute(self, shard_key, sql, sql_args=None, timeout=None,
+                session=None):
+        """Executes an SQL query with no results in the node of `shard_key`
+
+        See SQLConnectionHandler.execute for the rest of the parameters
+        """
+        self.handler_for(shard_key).execute(sql, sql_args, timeout=timeout,
+                                            session=session)
+
+    def executemany(self, shard_key, sql, sql_args_list, timeout=None,
+                    session=None):
+        """Executes an executemany SQL query in the node of `shard_key`
+
+        See SQLConnectionHandler.executemany for the rest of the parameters
+        """
+        self.handler_for(shard_key).executemany(sql, sql_args_list,
+                                                timeout=timeout,
+                                                session=session)
+
+    def execute_fetchone(self, shard_key, sql, sql_args=None, timeout=None,
+                         read_only=None, session=None):
+        """Executes a fetchone SQL query in the node of `shard_key`
+
+        See SQLConnectionHandler.execute_fetchone for the rest of the
+        parameters
+        """
+        return self.handler_for(shard_key).execute_fetchone(
+            sql, sql_args, timeout=timeout, read_only=read_only,
+            session=session)
+
+    def execute_fetchall(self, shard_key, sql, sql_args=None, timeout=None,
+                         read_only=None, max_rows=None, max_bytes=None,
+                         session=None):
+        """Executes a fetchall SQL query in the node of `shard_key`
+
+        See SQLConnectionHandler.execute_fetchall for the rest of the
+        parameters
+        """
+        return self.handler_for(shard_key).execute_fetchall(
+            sql, sql_args, timeout=timeout, read_only=read_only,
+            max_rows=max_rows, max_bytes=max_bytes, session=session)
+
+    def create_queue(self, shard_key, queue_name):
+        """Adds a new queue to the node of `shard_key`
+
+        See SQLConnectionHandler.create_queue for the rest of the parameters
+        """
+        self.handler_for(shard_key).create_queue(queue_name)
+
+    def add_to_queue(self, shard_key, queue, sql, sql_args=None,
+                     many=False):
+        """Adds an SQL command to a queue of the node of `shard_key`
+
+        See SQLConnectionHandler.add_to_queue for the rest of the parameters
+        """
+        self.handler_for(shard_key).add_to_queue(queue, sql, sql_args,
+                                                 many=many)
+
+    def execute_queue(self, shard_key, queue, timeout=None, max_rows=None,
+                      max_bytes=None, session=None):
+        """Executes a queue of the node of `shard_key` in a transaction
+
+        See SQLConnectionHandler.execute_queue for the rest of the parameters
+        """
+        return self.handler_for(shard_key).execute_queue(
+            queue, timeout=timeout, max_rows=max_rows, max_bytes=max_bytes,
+            session=session)
+
+    def scatter_fetchall(self, sql, sql_args=None, timeout=None,
+                         session=None):
+        """Executes a fetchall SQL query in all the nodes in parallel
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query
+        sql_args : tuple or list, optional
+            The arguments for the SQL query
+        timeout : float, optional
+            Maximum number of seconds the query can run in each node
+        session : str, optional
+            The name of the session profile applied to the transaction of
+            the query in each node. Defaults to the handler's session profile
+
+        Returns
+        -------
+        list of tuples
+            The results of all the nodes, in shard order
+
+        Raises
+        ------
+        GDExecutionError
+            If there is some error executing the SQL query in any node. The
+            query runs to completion in the rest of the nodes
+        """
+        results = [None] * len(self.handlers)
+        errors = [None] * len(self.handlers)
+
+        def fetch(pos):
+            try:
+                results[pos] = self.handlers[pos].execute_fetchall(
+                    sql, sql_args, timeout=timeout, session=session)
+            except Exception as e:
+                errors[pos] = e
+
+        threads = [Thread(target=fetch, args=(pos,))
+                   for pos in range(len(self.handlers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for error in errors:
+            if error is not None:
+                raise error
+
+        merged = []
+        for result in results:
+            merged.extend(result)
+        return merged
@@ -80,24 +80,140 @@ to the first SQL command):
 from __future__ import division
 from contextlib import contextmanager
 from functools import partial
+from io import StringIO
 from itertools import chain
-
-from psycopg2 import connect, ProgrammingError, Error as PostgresError
+from numbers import Integral
+from re import compile as re_compile, IGNORECASE
+from sys import getsizeof
+from threading import Event, Thread
+from time import time
+
+from future import standard_library
+with standard_library.hooks():
+    from queue import Full, Queue
+
+from psycopg2 import (connect, ProgrammingError, Error as PostgresError,
+                      sql as pgsql)
 from psycopg2.extras import DictCursor
+from psycopg2.pool import PoolError
 from psycopg2.extensions import (ISOLATION_LEVEL_AUTOCOMMIT,
-                                 ISOLATION_LEVEL_READ_COMMITTED)
+                                 ISOLATION_LEVEL_READ_COMMITTED,
+                                 QueryCanceledError)
 
 from gd import gd_config
-from gd.exceptions import GDExecutionError, GDConnectionError
+from gd.binary_copy import encode_columns, ChunkReader
+from gd.disk_cache import to_columns
+from gd.exceptions import (GDExecutionError, GDConnectionError,
+                           GDResultSizeError, GDTimeoutError)
+from gd.pool import get_pool
+from gd.watchdog import watchdog
 
 INIT_ADMIN_OPTS = {'no_admin', 'admin_with_database', 'admin_without_database'}
 
+# The text types, so the queue placeholders are also found in the unicode
+# arguments of python 2, e.g. those of the calls replayed from a workload log
+try:
+    _TEXT_TYPES = (basestring,)
+except NameError:
+    _TEXT_TYPES = (str,)
+
+
+# Sentinel to tell apart the keys not cached from the ones cached as None
+_NOT_CACHED = object()
+
+# Sentinel sent by each partition of a parallel scan once it has been read
+_SCAN_DONE = object()
+
+# Number of rows converted to Python objects at a time when fetching results
+_FETCH_CHUNK_ROWS = 1000
+
+# The queries applying and resetting the session profiles, keyed by the
+# settings applied and kind of query, so editing the profiles in the gd
+# configuration never returns stale queries
+_SESSION_SQL = {}
+
+# Statements that can run outside of a transaction block without changing
+# their result: SELECT (also parenthesized), VALUES, TABLE and SHOW
+_READ_ONLY_SQL = re_compile(r'\s*(\(\s*)*(SELECT|VALUES|TABLE|SHOW)\b',
+                            IGNORECASE)
+
 
 def flatten(list_of_lists):
     # https://docs.python.org/2/library/itertools.html
     return chain.from_iterable(list_of_lists)
 
 
+def table_identifier(table):
+    """Returns the SQL identifier of a, possibly schema qualified, table"""
+    return pgsql.SQL('.').join(pgsql.Identifier(part)
+                               for part in table.split('.'))
+
+
+_COPY_ESCAPES = {ord('\\'): u'\\\\', ord('\t'): u'\\t', ord('\n'): u'\\n',
+                 ord('\r'): u'\\r'}
+
+
+def _row_size(row):
+    """Approximate number of bytes taken by a fetched row"""
+    return getsizeof(row) + sum(getsizeof(value) for value in row)
+
+
+def _copy_text_value(value):
+    """Formats a value for the text format of COPY"""
+    if value is None:
+        return u'\\N'
+    if isinstance(value, bool):
+        return u't' if value else u'f'
+    return (u'%s' % value).translate(_COPY_ESCAPES)
+
+
+def _session_sql(name, base=None, kind='local'):
+    """Returns the SQL query applying or resetting a session profile
+
+    Parameters
+    ----------
+    name : str
+        The name of the session profile
+    base : str, optional
+        The session profile already applied to the connection, whose
+        settings are not applied again
+    kind : {'local', 'session', 'reset'}, optional
+        Whether the settings are applied to the current transaction, as SET
+        LOCAL does, to the session, as SET does, or reset to their defaults
+
+    Returns
+    -------
+    tuple of (str or psycopg2.sql.Composed, list) or None
+        The SQL query and its arguments, or None if there are no settings
+        to apply
+    """
+    base_settings = gd_config.sessions[base] if base is not None else {}
+    settings = tuple(sorted((setting, value) for setting, value
+                            in gd_config.sessions[name].items()
+                            if base_settings.get(setting) != value))
+    key = (settings, kind)
+    try:
+        return _SESSION_SQL[key]
+    except KeyError:
+        pass
+
+    if not settings:
+        query = None
+    elif kind == 'reset':
+        query = (pgsql.SQL('; ').join(
+            pgsql.SQL('RESET {0}').format(
+                pgsql.Identifier(*setting.split('.')))
+            for setting, _ in settings), [])
+    else:
+        # set_config also parses list values, e.g. of search_path
+        is_local = 'true' if kind == 'local' else 'false'
+        query = ("SELECT " + ", ".join(
+            ["set_config(%%s, %%s, %s)" % is_local] * len(settings)),
+            list(flatten(settings)))
+    _SESSION_SQL[key] = query
+    return query
+
+
 class SQLConnectionHandler(object):
     """Encapsulates the DB connection with the Postgres DB
 
@@ -110,85 +226,402 @@ class SQLConnectionHandler(object):
         to the server specified in the gd configuration, but not to a
         specific database. If 'admin_with_database', then a connection will be
         made to the server and database specified in the gd config.
+    profile : str, optional
+        The name of the connection profile in the gd configuration to use.
+        If the profile has a connection pool, the connection is taken from
+        it and returned to it when the handler is closed. Default: 'default'
+    timeout : float, optional
+        The default maximum number of seconds that a call to any of the
+        execute methods can run before its query is cancelled. Can be
+        overridden on each call. Default: no timeout.
+    explain_sampler : gd.explain.ExplainSampler, optional
+        If provided, the plans of the plain SELECT, VALUES and TABLE queries
+        run through `execute`, `execute_fetchone` and `execute_fetchall`
+        selected by the sampler are captured in it. Default: plans are not
+        captured.
+    result_cache : gd.cache.ResultCache, optional
+        The cache used by `execute_fetch_by_keys` when called with
+        `use_cache=True`. It can be shared by several handlers.
+    disk_cache : gd.disk_cache.DiskCache, optional
+        The cache used by `execute_fetch_columns` when called with
+        `use_cache=True`. It can be shared by several handlers and processes.
+    recorder : gd.workload.WorkloadRecorder, optional
+        If provided, all the calls run through `_sql_executor` (i.e. the
+        execute methods) and `execute_queue` are recorded in it, so they can
+        be replayed later with `gd.workload.replay`.
+    admission : gd.admission.AdmissionController, optional
+        If provided, the calls of the handler wait to be admitted by it in
+        the lane `lane` before running. It should be shared by all the
+        handlers whose concurrency is limited together.
+    lane : str, optional
+        The lane of `admission` in which the calls of the handler run.
+        Required if `admission` is provided.
+    detect_read_only : bool, optional
+        If True, the queries run through the execute methods that are
+        detected as plain SELECTs (also VALUES, TABLE and SHOW) run in
+        autocommit, as if the calls passed `read_only=True`. Default: False
+    max_rows : int, optional
+        The default maximum number of rows that `execute_fetchall` and
+        `execute_queue` can fetch. Can be overridden on each call. Default:
+        no limit
+    max_bytes : int, optional
+        The default maximum approximate memory, in bytes, of the rows that
+        `execute_fetchall` and `execute_queue` can fetch. Can be overridden
+        on each call. Default: no limit
+    session : str, optional
+        The name of the session profile of the gd configuration applied to
+        the connection of the handler, once each time it is opened or taken
+        from the pool. The calls to the execute methods and `execute_queue`
+        can select another profile, applied to their transaction only, on
+        top of the handler's one. Only the settings that differ from the
+        handler's profile are sent. Default: the postgres defaults
+
+    Attributes
+    ----------
+    last_result_rows : int or None
+        The number of rows fetched by the last `execute_fetchall` or
+        `execute_queue` call
+    last_result_bytes : int or None
+        The approximate memory, in bytes, taken by the rows fetched by the
+        last `execute_fetchall` or `execute_queue` call, to find the calls
+        with heavy results
+
+    Notes
+    -----
+    By default, each call to the execute methods runs in its own
+    transaction, so a single SELECT costs a BEGIN and a COMMIT besides the
+    query itself. The calls marked as read-only, or detected as such with
+    `detect_read_only`, run in autocommit instead, which postgres also runs
+    in its own transaction but without those two extra round-trips.
     """.format(INIT_ADMIN_OPTS)
 
-    def __init__(self, admin='no_admin'):
+    def __init__(self, admin='no_admin', profile='default', timeout=None,
+                 explain_sampler=None, result_cache=None, recorder=None,
+                 admission=None, lane=None, detect_read_only=False,
+                 max_rows=None, max_bytes=None, disk_cache=None,
+                 session=None):
         if admin not in INIT_ADMIN_OPTS:
             raise GDConnectionError(
                 "admin takes only on of %s" % INIT_ADMIN_OPTS)
+        if profile not in gd_config.profiles:
+            raise GDConnectionError(
+                "profile %s is not defined in the configuration" % profile)
+        if admission is not None and lane is None:
+            raise ValueError("A lane is required to use admission control")
+        if session is not None and session not in gd_config.sessions:
+            raise ValueError(
+                "session %s is not defined in the configuration" % session)
 
         self.admin = admin
+        self.profile = profile
+        self.timeout = timeout
+        self.explain_sampler = explain_sampler
+        self.result_cache = result_cache
+        self.disk_cache = disk_cache
+        self.recorder = recorder
+        self.admission = admission
+        self.lane = lane
+        self.detect_read_only = detect_read_only
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.last_result_rows = None
+        self.last_result_bytes = None
+        self.session = session
+        self._session_applied = False
+        self._session_reset = None
         self._connection = None
+        self._pool = None
         self._open_connection()
         # queues for transaction blocks. Format is {str: list} where the str
         # is the queue name and the list is the queue of SQL commands
         self.queues = {}
 
     def __del__(self):
-        # Close the connection only if it is not already closed
         try:
-            if self._connection and not self._connection.closed:
-                self._connection.close()
+            self.close()
         except AttributeError:
             # There was an issue initializing the connection attribute and
             # it does not exist
             pass
 
+    def close(self):
+        """Closes the connection, or returns it to the pool if pooled
+
+        The connection is opened again if the handler is used afterwards
+        """
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+
+        session_applied, self._session_applied = self._session_applied, False
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            if not pool.closed:
+                if not connection.closed and connection.autocommit:
+                    connection.autocommit = False
+                if session_applied and not connection.closed:
+                    # Do not leak the session profile to other handlers
+                    try:
+                        connection.rollback()
+                        reset = self._session_reset
+                        with connection.cursor() as cur:
+                            cur.execute(*reset)
+                        connection.commit()
+                    except PostgresError:
+                        pool.putconn(connection, close=True)
+                        return
+                # The pool rolls back any transaction left open
+                pool.putconn(connection)
+                return
+
+        # Close the connection only if it is not already closed
+        if not connection.closed:
+            connection.close()
+
     def _open_connection(self):
+        # Release the previous connection, which has been closed
+        self.close()
+
+        profile = gd_config.profiles[self.profile]
         # connection string arguments for a normal user
         args = {
-            'user': gd_config.user,
-            'password': gd_config.password,
-            'database': gd_config.database,
-            'host': gd_config.host,
-            'port': gd_config.port}
+            'user': profile.user,
+            'password': profile.password,
+            'database': profile.database,
+            'host': profile.host,
+            'port': profile.port}
 
         # if this is an admin user, use the admin credentials
         if self.admin != 'no_admin':
-            args['user'] = gd_config.admin_user
-            args['password'] = gd_config.admin_password
+            args['user'] = profile.admin_user
+            args['password'] = profile.admin_password
 
         # Do not connect to a particular database unless requested
         if self.admin == 'admin_without_database':
             del args['database']
 
+        if profile.pool_max_size:
+            pool = get_pool((self.profile, self.admin), profile.pool_min_size,
+                            profile.pool_max_size, args)
+            try:
+                self._connection = pool.getconn()
+            except PoolError as e:
+                # The pool does not wait for a connection to be returned
+                raise GDConnectionError(
+                    "Cannot get a connection from the pool of profile %s, "
+                    "limited to %d connections: %s. Close the handlers not "
+                    "in use or increase the pool size of the profile"
+                    % (self.profile, profile.pool_max_size, str(e)))
+            except Exception as e:
+                raise GDConnectionError(
+                    "Cannot connect to database: %s" % str(e))
+            self._pool = pool
+        else:
+            try:
+                self._connection = connect(**args)
+            except Exception as e:
+                # catch any exception and raise as runtime error
+                raise GDConnectionError(
+                    "Cannot connect to database: %s" % str(e))
+
+        self._apply_session()
+
+    def _apply_session(self):
+        """Applies the handler session profile to its connection"""
+        if self.session is None:
+            return
+        query = _session_sql(self.session, kind='session')
+        if query is None:
+            return
+
+        # Reset the settings applied, even if the profile is edited in the
+        # meantime
+        reset = _session_sql(self.session, kind='reset')
         try:
-            self._connection = connect(**args)
-        except Exception as e:
-            # catch any exception and raise as runtime error
-            raise GDConnectionError("Cannot connect to database: %s" % str(e))
+            with self._connection.cursor() as cur:
+                cur.execute(*query)
+            self._connection.commit()
+        except PostgresError as e:
+            self.close()
+            raise GDConnectionError("Cannot apply the session profile %s: %s"
+                                    % (self.session, e))
+        self._session_reset = reset
+        self._session_applied = True
+
+    def _session_query(self, session):
+        """Returns the SQL query applying a session profile to a transaction
+
+        Parameters
+        ----------
+        session : str or None
+            The name of the session profile selected by the call
+
+        Returns
+        -------
+        tuple of (str, list) or None
+            The SQL query and its arguments, or None if there are no settings
+            to apply besides the ones of the handler session profile
+
+        Raises
+        ------
+        ValueError
+            If the session profile does not exist
+        """
+        if session is None or session == self.session:
+            return None
+        if session not in gd_config.sessions:
+            raise ValueError(
+                "session %s is not defined in the configuration" % session)
+        return _session_sql(session, base=self.session)
 
     @contextmanager
-    def get_postgres_cursor(self):
+    def get_postgres_cursor(self, name=None):
         """ Returns a Postgres cursor
 
+        Parameters
+        ----------
+        name : str, optional
+            If provided, the cursor is a server side cursor with this name,
+            which can only be used in a transaction
+
         Returns
         -------
         pgcursor : psycopg2.cursor
 
         Raises a GDConnectionError if the cursor cannot be created
         """
-        if self._connection.closed:
+        if self._connection is None or self._connection.closed:
             self._open_connection()
 
         try:
-            with self._connection.cursor(cursor_factory=DictCursor) as cur:
+            with self._connection.cursor(
+                    name, cursor_factory=DictCursor) as cur:
                 yield cur
         except PostgresError as e:
             raise GDConnectionError("Error running query: %s" % e)
 
     @property
     def autocommit(self):
+        if self._connection is None or self._connection.closed:
+            self._open_connection()
         return self._connection.isolation_level == ISOLATION_LEVEL_AUTOCOMMIT
 
     @autocommit.setter
     def autocommit(self, value):
         if not isinstance(value, bool):
             raise TypeError('The value for autocommit should be a boolean')
+        if self._connection is None or self._connection.closed:
+            self._open_connection()
         level = (ISOLATION_LEVEL_AUTOCOMMIT if value
                  else ISOLATION_LEVEL_READ_COMMITTED)
         self._connection.set_isolation_level(level)
 
+    @contextmanager
+    def _deadline(self, timeout=None):
+        """Cancels the query running in the connection if it takes too long
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds that the block can run before the
+            running query is cancelled. Defaults to the handler's timeout.
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        if timeout is None:
+            yield
+            return
+
+        token = watchdog.arm(self._connection, timeout)
+        try:
+            yield
+        finally:
+            watchdog.disarm(token)
+
+    @contextmanager
+    def _read_only(self, read_only):
+        """Runs the block in autocommit if `read_only`
+
+        Parameters
+        ----------
+        read_only : bool
+            Whether the block only runs a read-only query
+        """
+        connection = self._connection
+        if not read_only or connection.autocommit:
+            yield
+            return
+
+        connection.autocommit = True
+        try:
+            yield
+        finally:
+            if not connection.closed:
+                connection.autocommit = False
+
+    def _is_read_only(self, sql, read_only=None):
+        """Whether an SQL query can run in the read-only fast path
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query
+        read_only : bool, optional
+            Whether the caller marked the query as read-only. If None, the
+            query is read-only if the handler detects read-only queries and
+            it is a plain SELECT
+
+        Returns
+        -------
+        bool
+        """
+        if read_only is not None:
+            return read_only
+        return (self.detect_read_only and
+                not isinstance(sql, pgsql.Composable) and
+                _READ_ONLY_SQL.match(sql) is not None)
+
+    @contextmanager
+    def _admitted(self):
+        """Waits for the handler's admission controller to run the block
+
+        Raises
+        ------
+        GDAdmissionError
+            If the block is not admitted before the lane deadline
+        """
+        if self.admission is None:
+            yield
+            return
+
+        with self.admission.admit(self.lane):
+            yield
+
+    @contextmanager
+    def _recording(self, kind, statements):
+        """Records the call run in the block in the handler's recorder
+
+        Parameters
+        ----------
+        kind : {'execute', 'executemany', 'queue'}
+            The kind of call
+        statements : list of (str, object)
+            The SQL queries of the call and their arguments
+        """
+        recorder = self.recorder
+        if recorder is None:
+            yield
+            return
+
+        start = time()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            recorder.record(kind, statements, start, time() - start, failed)
+
     def _check_sql_args(self, sql_args):
         """Checks that sql_args have the correct type
 
@@ -211,8 +644,130 @@ class SQLConnectionHandler(object):
             raise TypeError("sql_args should be tuple, list or dict. Found %s "
                             % type(sql_args))
 
+    def _size_limited(self, max_rows=None, max_bytes=None):
+        """Whether a call has any result size limit
+
+        Parameters
+        ----------
+        max_rows, max_bytes : int, optional
+            The size limits of the call. Default to the handler's limits
+
+        Returns
+        -------
+        bool
+        """
+        return not (max_rows is None and max_bytes is None and
+                    self.max_rows is None and self.max_bytes is None)
+
+    def _check_server_side(self, server_side):
+        """Checks that a server side cursor can be used
+
+        Parameters
+        ----------
+        server_side : bool
+            Whether the call asked for a server side cursor
+
+        Raises
+        ------
+        ValueError
+            If `server_side` and the handler is in autocommit, as server side
+            cursors need a transaction
+        """
+        if server_side and self._connection is not None and \
+                not self._connection.closed and self._connection.autocommit:
+            raise ValueError("Server side cursors cannot be used in "
+                             "autocommit")
+
+    def _close_server_side(self, cur):
+        """Closes a server side cursor, which is only valid in its transaction
+
+        Parameters
+        ----------
+        cur : psycopg2.cursor
+            The cursor. Client side cursors are left open
+        """
+        if cur.name is not None:
+            cur.close()
+
+    def _fetch_all(self, cur, max_rows=None, max_bytes=None, n_rows=0,
+                   n_bytes=0):
+        """Fetches all the rows of a cursor, enforcing the size limits
+
+        Parameters
+        ----------
+        cur : psycopg2.cursor
+            The cursor in which the SQL query was executed
+        max_rows : int, optional
+            Maximum number of rows. Defaults to the handler's max_rows
+        max_bytes : int, optional
+            Maximum approximate memory of the rows, in bytes. Defaults to the
+            handler's max_bytes
+        n_rows : int, optional
+            The number of rows already fetched, counted against the limits
+        n_bytes : int, optional
+            The memory of the rows already fetched, counted against the
+            limits
+
+        Returns
+        -------
+        tuple of (list, int, int)
+            The rows, and the total number of rows and bytes fetched,
+            including `n_rows` and `n_bytes`
+
+        Raises
+        ------
+        GDResultSizeError
+            If the rows exceed any of the limits
+        ProgrammingError
+            If the SQL query does not return rows
+
+        Notes
+        -----
+        The rows are fetched in chunks, so the limits are enforced before all
+        of them are received. Through a server side cursor, postgres sends
+        each chunk on request, so the limits bound the memory used. Through a
+        client side cursor, the whole result has already been received, and
+        only building the rows is avoided.
+        """
+        if max_rows is None:
+            max_rows = self.max_rows
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        # The number of rows of a client side cursor is known before
+        # fetching any of them
+        if (max_rows is not None and cur.name is None and
+                cur.description is not None and
+                n_rows + cur.rowcount > max_rows):
+            raise GDResultSizeError(
+                "The result has %d rows, more than the limit of %d"
+                % (n_rows + cur.rowcount, max_rows))
+
+        rows = []
+        while True:
+            size = _FETCH_CHUNK_ROWS
+            if max_rows is not None:
+                # One more row than allowed is enough to exceed the limit
+                size = min(size, max_rows - n_rows - len(rows) + 1)
+            chunk = cur.fetchmany(size)
+            if not chunk:
+                break
+            if max_rows is not None and \
+                    n_rows + len(rows) + len(chunk) > max_rows:
+                raise GDResultSizeError(
+                    "The result has more than the limit of %d rows"
+                    % max_rows)
+            n_bytes += sum(_row_size(row) for row in chunk)
+            if max_bytes is not None and n_bytes > max_bytes:
+                raise GDResultSizeError(
+                    "The result takes more than the limit of %d bytes"
+                    % max_bytes)
+            rows.extend(chunk)
+        return rows, n_rows + len(rows), n_bytes
+
     @contextmanager
-    def _sql_executor(self, sql, sql_args=None, many=False):
+    def _sql_executor(self, sql, sql_args=None, many=False, timeout=None,
+                      read_only=None, session=None, server_side=False):
         """Executes an SQL query
 
         Parameters
@@ -223,6 +778,21 @@ class SQLConnectionHandler(object):
             The arguments for the SQL query
         many : bool, optional
             If true, performs an execute many call
+        timeout : float, optional
+            Maximum number of seconds the query can run. Defaults to the
+            handler's timeout
+        read_only : bool, optional
+            Whether the query is read-only, so it runs in autocommit instead
+            of in a transaction. If None, it is detected if the handler
+            detects read-only queries
+        session : str, optional
+            The session profile applied to the transaction. Its settings
+            need a transaction, so the query does not run in autocommit.
+            Defaults to the handler's session profile
+        server_side : bool, optional
+            If True, the query is run through a server side cursor, so its
+            results are received as they are fetched. It needs a
+            transaction, so the query does not run in autocommit
 
         Returns
         -------
@@ -233,6 +803,8 @@ class SQLConnectionHandler(object):
         ------
         GDExecutionError
             If there is some error executing the SQL query
+        GDTimeoutError
+            If the SQL query is cancelled for exceeding its timeout
         """
         # Check that sql arguments have the correct type
         if many:
@@ -242,22 +814,49 @@ class SQLConnectionHandler(object):
             self._check_sql_args(sql_args)
 
         # Execute the query
-        with self.get_postgres_cursor() as cur:
+        kind = 'executemany' if many else 'execute'
+        session_query = self._session_query(session)
+        read_only = (not many and session_query is None and
+                     not server_side and self._is_read_only(sql, read_only))
+        name = 'gd_fetch' if server_side else None
+        with self._admitted(), self._recording(kind, [(sql, sql_args)]), \
+                self.get_postgres_cursor(name) as cur, \
+                self._read_only(read_only):
             execute = partial(cur.executemany if many else cur.execute,
                               sql, sql_args)
             try:
-                execute()
-                yield cur
+                with self._deadline(timeout):
+                    if session_query is not None:
+                        with self._connection.cursor() as session_cur:
+                            session_cur.execute(*session_query)
+                    start = time()
+                    execute()
+                    duration = time() - start
+                    yield cur
+            except GDResultSizeError:
+                self._close_server_side(cur)
+                self._connection.rollback()
+                raise
             except PostgresError as e:
+                self._close_server_side(cur)
                 self._connection.rollback()
-                raise GDExecutionError(("\nError running SQL query: %s"
-                                        "\nARGS: %s"
-                                        "\nError: %s" %
-                                        (sql, str(sql_args), e)))
+                error = (GDTimeoutError if isinstance(e, QueryCanceledError)
+                         else GDExecutionError)
+                raise error(("\nError running SQL query: %s"
+                             "\nARGS: %s"
+                             "\nError: %s" % (sql, str(sql_args), e)))
             else:
+                # The plan is captured without the timeout, so a late cancel
+                # cannot abort the transaction of a successful call
+                sampler = self.explain_sampler
+                if (sampler is not None and not many and
+                        sampler.should_explain(duration)):
+                    with self._connection.cursor() as explain_cur:
+                        sampler.explain(explain_cur, sql, sql_args, duration)
+                self._close_server_side(cur)
                 self._connection.commit()
 
-    def execute(self, sql, sql_args=None):
+    def execute(self, sql, sql_args=None, timeout=None, session=None):
         """ Executes an SQL query with no results
 
         Parameters
@@ -266,11 +865,20 @@ class SQLConnectionHandler(object):
             The SQL query
         sql_args : tuple or list, optional
             The arguments for the SQL query
+        timeout : float, optional
+            Maximum number of seconds the query can run before being
+            cancelled. Defaults to the handler's timeout
+        session : str, optional
+            The name of the session profile of the gd configuration applied
+            to the transaction of the call. Defaults to the handler's session
+            profile
 
         Raises
         ------
         GDExecutionError
             if there is some error executing the SQL query
+        GDTimeoutError
+            If the SQL query is cancelled for exceeding its timeout
 
         Notes
         -----
@@ -279,10 +887,12 @@ class SQLConnectionHandler(object):
         elements, ordinary string formatting should be used before running
         execute.
         """
-        with self._sql_executor(sql, sql_args):
+        with self._sql_executor(sql, sql_args, timeout=timeout,
+                                session=session):
             pass
 
-    def executemany(self, sql, sql_args_list):
+    def executemany(self, sql, sql_args_list, timeout=None,
+                    session=None):
         """ Executes an executemany SQL query with no results
 
         Parameters
@@ -291,11 +901,20 @@ class SQLConnectionHandler(object):
             The SQL query
         sql_args : list of tuples
             The arguments for the SQL query
+        timeout : float, optional
+            Maximum number of seconds the query can run before being
+            cancelled. Defaults to the handler's timeout
+        session : str, optional
+            The name of the session profile of the gd configuration applied
+            to the transaction of the call. Defaults to the handler's session
+            profile
 
         Raises
         ------
         GDExecutionError
             If there is some error executing the SQL query
+        GDTimeoutError
+            If the SQL query is cancelled for exceeding its timeout
 
         Notes
         -----
@@ -304,10 +923,12 @@ class SQLConnectionHandler(object):
         elements, ordinary string formatting should be used before running
         execute.
         """
-        with self._sql_executor(sql, sql_args_list, True):
+        with self._sql_executor(sql, sql_args_list, True, timeout=timeout,
+                                session=session):
             pass
 
-    def execute_fetchone(self, sql, sql_args=None):
+    def execute_fetchone(self, sql, sql_args=None, timeout=None,
+                         read_only=None, session=None):
         """ Executes a fetchone SQL query
 
         Parameters
@@ -316,6 +937,19 @@ class SQLConnectionHandler(object):
             The SQL query
         sql_args : tuple or list, optional
             The arguments for the SQL query
+        timeout : float, optional
+            Maximum number of seconds the query can run before being
+            cancelled. Defaults to the handler's timeout
+        read_only : bool, optional
+            If True, the query runs in autocommit, saving the round-trips to
+            begin and commit a transaction. It should only be used for
+            queries that do not write. Defaults to True if the handler
+            detects read-only queries and the query is a plain SELECT, False
+            otherwise
+        session : str, optional
+            The name of the session profile of the gd configuration applied
+            to the transaction of the call. Defaults to the handler's session
+            profile
 
         Returns
         -------
@@ -326,6 +960,8 @@ class SQLConnectionHandler(object):
         ------
         GDExecutionError
             if there is some error executing the SQL query
+        GDTimeoutError
+            If the SQL query is cancelled for exceeding its timeout
 
         Notes
         -----
@@ -334,11 +970,15 @@ class SQLConnectionHandler(object):
         elements, ordinary string formatting should be used before running
         execute.
         """
-        with self._sql_executor(sql, sql_args) as pgcursor:
+        with self._sql_executor(sql, sql_args, timeout=timeout,
+                                read_only=read_only,
+                                session=session) as pgcursor:
             result = pgcursor.fetchone()
         return result
 
-    def execute_fetchall(self, sql, sql_args=None):
+    def execute_fetchall(self, sql, sql_args=None, timeout=None,
+                         read_only=None, max_rows=None, max_bytes=None,
+                         session=None, server_side=False):
         """ Executes a fetchall SQL query
 
         Parameters
@@ -347,6 +987,32 @@ class SQLConnectionHandler(object):
             The SQL query
         sql_args : tuple or list, optional
             The arguments for the SQL query
+        timeout : float, optional
+            Maximum number of seconds the query can run before being
+            cancelled. Defaults to the handler's timeout
+        read_only : bool, optional
+            If True, the query runs in autocommit, saving the round-trips to
+            begin and commit a transaction. It should only be used for
+            queries that do not write. Defaults to True if the handler
+            detects read-only queries and the query is a plain SELECT, False
+            otherwise
+        max_rows : int, optional
+            Maximum number of rows of the results. Defaults to the handler's
+            max_rows
+        max_bytes : int, optional
+            Maximum approximate memory of the results, in bytes. Defaults to
+            the handler's max_bytes. If any limit is set, the query never
+            runs in autocommit, even if `read_only`
+        session : str, optional
+            The name of the session profile of the gd configuration applied
+            to the transaction of the call. Defaults to the handler's session
+            profile
+        server_side : bool, optional
+            If True, the query is read through a server side cursor, so its
+            results are received in chunks as they are fetched and the size
+            limits bound the memory used. Only single SELECT, VALUES or TABLE
+            queries can, and the handler should not be in autocommit.
+            Default: False, the whole results are received at once
 
         Returns
         ------
@@ -355,8 +1021,15 @@ class SQLConnectionHandler(object):
 
         Raises
         ------
+        ValueError
+            If `server_side` is True and the handler is in autocommit
         GDExecutionError
             If there is some error executing the SQL query
+        GDTimeoutError
+            If the SQL query is cancelled for exceeding its timeout
+        GDResultSizeError
+            If the results exceed `max_rows` or `max_bytes`. The transaction
+            is rolled back, unless the handler is in autocommit
 
         Notes
         -----
@@ -365,10 +1038,649 @@ class SQLConnectionHandler(object):
         elements, ordinary string formatting should be used before running
         execute.
         """
-        with self._sql_executor(sql, sql_args) as pgcursor:
-            result = pgcursor.fetchall()
+        self._check_server_side(server_side)
+        # The results of limited calls are fetched in a transaction, so it
+        # can be rolled back if they exceed the limits
+        if self._size_limited(max_rows, max_bytes):
+            read_only = False
+        with self._sql_executor(sql, sql_args, timeout=timeout,
+                                read_only=read_only, session=session,
+                                server_side=server_side) as pgcursor:
+            result, n_rows, n_bytes = self._fetch_all(pgcursor, max_rows,
+                                                      max_bytes)
+        self.last_result_rows = n_rows
+        self.last_result_bytes = n_bytes
         return result
 
+    def execute_fetch_columns(self, sql, sql_args=None, use_cache=False,
+                              version=None, timeout=None, read_only=None,
+                              max_rows=None, max_bytes=None, session=None,
+                              server_side=False):
+        """Executes a fetchall SQL query returning its results by column
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query
+        sql_args : tuple or list, optional
+            The arguments for the SQL query
+        use_cache : bool, optional
+            If True, the results are read from the handler disk cache if
+            cached there, and cached otherwise. Default: False
+        version : str, optional
+            The version token of the cached results, e.g. the date of the
+            last load of the tables queried, so the results cached for
+            previous versions are not used
+        timeout, read_only, max_rows, max_bytes, session : optional
+            See `execute_fetchall`
+        server_side : bool, optional
+            See `execute_fetchall`
+
+        Returns
+        -------
+        OrderedDict of {str: numpy.ndarray}
+            The values of each column of the results, as returned by
+            gd.disk_cache.to_columns. The results read from the cache are
+            read-only memory mapped arrays
+
+        Raises
+        ------
+        ValueError
+            If `use_cache` is True and the handler does not have a disk cache,
+            or if `server_side` is True and the handler is in autocommit
+        ImportError
+            If NumPy is not installed
+        GDExecutionError
+            If there is some error executing the SQL query
+        GDTimeoutError
+            If the SQL query is cancelled for exceeding its timeout
+        GDResultSizeError
+            If the results exceed `max_rows` or `max_bytes`
+        """
+        cache = self.disk_cache
+        if use_cache:
+            if cache is None:
+                raise ValueError("The handler does not have a disk cache")
+            columns = cache.get(sql, sql_args, version)
+            if columns is not None:
+                return columns
+
+        self._check_server_side(server_side)
+        # The results of limited calls are fetched in a transaction, so it
+        # can be rolled back if they exceed the limits
+        if self._size_limited(max_rows, max_bytes):
+            read_only = False
+        with self._sql_executor(sql, sql_args, timeout=timeout,
+                                read_only=read_only, session=session,
+                                server_side=server_side) as pgcursor:
+            rows, n_rows, n_bytes = self._fetch_all(pgcursor, max_rows,
+                                                    max_bytes)
+            names = [column[0] for column in pgcursor.description]
+        self.last_result_rows = n_rows
+        self.last_result_bytes = n_bytes
+
+        columns = to_columns(names, rows)
+        if use_cache:
+            cache.put(sql, sql_args, columns, version)
+        return columns
+
+    def execute_fetch_by_keys(self, sql_template, keys, chunk_size=1000,
+                              key=0, use_cache=False, timeout=None):
+        """Fetches the rows of many keys with a few chunked queries
+
+        Parameters
+        ----------
+        sql_template : str
+            The SQL query, filtering the rows with `= ANY(%s)`, e.g.
+            "SELECT id, name FROM user WHERE id = ANY(%s)". It should return
+            at most one row per key
+        keys : iterable
+            The keys whose rows are fetched
+        chunk_size : int, optional
+            The maximum number of keys per query. Default: 1000
+        key : int or str, optional
+            The position or name of the column of the rows that holds their
+            key. Default: the first column
+        use_cache : bool, optional
+            If True, the rows of keys in the handler result cache are not
+            fetched again and the fetched rows are added to it. Default:
+            False
+        timeout : float, optional
+            Maximum number of seconds each of the queries can run before
+            being cancelled. Defaults to the handler's timeout
+
+        Returns
+        -------
+        dict
+            The row of each key, or None for the keys without a row
+
+        Raises
+        ------
+        ValueError
+            If `use_cache` is True and the handler does not have a cache
+        GDExecutionError
+            If there is some error executing the SQL query
+        GDTimeoutError
+            If the SQL query is cancelled for exceeding its timeout
+
+        Notes
+        -----
+        This replaces a loop of `execute_fetchone` calls, one per key, with
+        one round-trip per `chunk_size` keys. Each chunk is fetched in its
+        own transaction.
+        """
+        cache = self.result_cache
+        if use_cache and cache is None:
+            raise ValueError("The handler does not have a result cache")
+
+        result = {}
+        missing = []
+        for k in keys:
+            if k in result:
+                continue
+            result[k] = None
+            if use_cache:
+                cached = cache.get((sql_template, k), _NOT_CACHED)
+                if cached is not _NOT_CACHED:
+                    result[k] = cached
+                    continue
+            missing.append(k)
+
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            with self._sql_executor(sql_template, [chunk],
+                                    timeout=timeout) as pgcursor:
+                rows = pgcursor.fetchall()
+            for row in rows:
+                result[row[key]] = row
+            if use_cache:
+                for k in chunk:
+                    cache.put((sql_template, k), result[k])
+
+        return result
+
+    def upsert_many(self, table, key_columns, rows, timeout=None):
+        """Inserts the rows of a table, updating the ones already present
+
+        Parameters
+        ----------
+        table : str
+            The name of the table, optionally schema qualified
+        key_columns : list of str
+            The columns of the primary key or unique constraint used to
+            detect the rows already present in the table
+        rows : list of dict of {str: object}
+            The rows to insert or update, as dicts keyed by column name. All
+            the rows should have the same columns, including `key_columns`
+        timeout : float, optional
+            Maximum number of seconds the whole transaction can run before
+            being cancelled. Defaults to the handler's timeout
+
+        Returns
+        -------
+        tuple of (int, int)
+            The number of inserted rows and the number of updated rows
+
+        Raises
+        ------
+        ValueError
+            If the rows do not have the same columns or they do not contain
+            all the key columns
+        GDExecutionError
+            If there is some error executing the SQL queries
+        GDTimeoutError
+            If the transaction is cancelled for exceeding its timeout
+
+        Notes
+        -----
+        The rows are staged with COPY into a temporary table and merged in
+        the table with a single INSERT ... ON CONFLICT DO UPDATE, all in the
+        same transaction, which is rolled back on error. As with any
+        INSERT ... ON CONFLICT, two rows with the same key raise an error.
+
+        The values are sent in their text representation, so they should be
+        of a type whose `str` is accepted as input by the column type.
+        """
+        if not rows:
+            return 0, 0
+
+        columns = list(rows[0])
+        if not set(key_columns).issubset(columns):
+            raise ValueError("The rows should contain all the key columns %s"
+                             % key_columns)
+
+        column_set = set(columns)
+        data = StringIO()
+        for row in rows:
+            if set(row) != column_set:
+                raise ValueError("All the rows should have the columns %s"
+                                 % columns)
+            data.write(u'\t'.join(_copy_text_value(row[c]) for c in columns))
+            data.write(u'\n')
+        data.seek(0)
+
+        stage = pgsql.Identifier('_gd_upsert_stage')
+        column_ids = pgsql.SQL(', ').join(map(pgsql.Identifier, columns))
+        update_columns = [c for c in columns if c not in key_columns]
+        if update_columns:
+            conflict_action = pgsql.SQL('DO UPDATE SET {}').format(
+                pgsql.SQL(', ').join(
+                    pgsql.SQL('{0} = EXCLUDED.{0}').format(
+                        pgsql.Identifier(c)) for c in update_columns))
+        else:
+            conflict_action = pgsql.SQL('DO NOTHING')
+
+        create_sql = pgsql.SQL(
+            "CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+            "SELECT {columns} FROM {table} WITH NO DATA").format(
+                stage=stage, columns=column_ids,
+                table=table_identifier(table))
+        copy_sql = pgsql.SQL("COPY {stage} ({columns}) FROM STDIN").format(
+            stage=stage, columns=column_ids)
+        # xmax is 0 only for the rows inserted by the statement
+        merge_sql = pgsql.SQL(
+            "WITH upserted AS ("
+            "INSERT INTO {table} ({columns}) SELECT {columns} FROM {stage} "
+            "ON CONFLICT ({keys}) {action} RETURNING (xmax = 0) AS inserted) "
+            "SELECT COUNT(*) FILTER (WHERE inserted), "
+            "COUNT(*) FILTER (WHERE NOT inserted) FROM upserted").format(
+                table=table_identifier(table), columns=column_ids,
+                stage=stage, action=conflict_action,
+                keys=pgsql.SQL(', ').join(
+                    map(pgsql.Identifier, key_columns)))
+
+        with self._admitted(), self.get_postgres_cursor() as cur, \
+                self._deadline(timeout):
+            # The staging table only lives in a transaction, so open one
+            # explicitly in autocommit
+            autocommit = self._connection.autocommit
+            try:
+                if autocommit:
+                    cur.execute("BEGIN")
+                cur.execute(create_sql)
+                cur.copy_expert(copy_sql.as_string(cur), data)
+                cur.execute(merge_sql)
+                inserted, updated = cur.fetchone()
+            except PostgresError as e:
+                if autocommit:
+                    cur.execute("ROLLBACK")
+                else:
+                    self._connection.rollback()
+                error = (GDTimeoutError if isinstance(e, QueryCanceledError)
+                         else GDExecutionError)
+                raise error("\nError upserting into %s: %s" % (table, e))
+            else:
+                if autocommit:
+                    cur.execute("COMMIT")
+                else:
+                    self._connection.commit()
+        return inserted, updated
+
+    def copy_columns(self, table, columns, chunk_rows=65536, timeout=None):
+        """Loads columns of values in a table with a binary COPY
+
+        Parameters
+        ----------
+        table : str
+            The name of the table, optionally schema qualified
+        columns : list of (str, array_like)
+            The name and values of each column to load. The values can be
+            NumPy arrays or any object supporting the buffer protocol, all of
+            the same length. A dict (ordered) of {name: values} is also
+            accepted
+        chunk_rows : int, optional
+            Number of rows encoded and sent at a time. Default: 65536
+        timeout : float, optional
+            Maximum number of seconds the COPY can run before being
+            cancelled. Defaults to the handler's timeout
+
+        Returns
+        -------
+        int
+            The number of rows loaded
+
+        Raises
+        ------
+        ImportError
+            If NumPy is not installed
+        TypeError
+            If a column has an unsupported type
+        ValueError
+            If the columns have different lengths or `chunk_rows` is lower
+            than 1
+        GDExecutionError
+            If there is some error executing the COPY
+        GDTimeoutError
+            If the COPY is cancelled for exceeding its timeout
+
+        Notes
+        -----
+        The values are encoded in chunks straight from the column buffers,
+        without creating a Python object per value. The supported types are
+        bool, int16, int32, int64, float32 and float64, which should match
+        exactly the types of the table columns (bool, int2, int4, int8,
+        float4 and float8). NULL values are not supported.
+
+        All the rows are loaded in a single transaction.
+        """
+        if hasattr(columns, 'items'):
+            columns = list(columns.items())
+        names = [name for name, _ in columns]
+        chunks = encode_columns([values for _, values in columns],
+                                chunk_rows)
+
+        copy_sql = pgsql.SQL(
+            "COPY {table} ({columns}) FROM STDIN WITH (FORMAT binary)").format(
+                table=table_identifier(table),
+                columns=pgsql.SQL(', ').join(map(pgsql.Identifier, names)))
+
+        with self._admitted(), self.get_postgres_cursor() as cur, \
+                self._deadline(timeout):
+            try:
+                cur.copy_expert(copy_sql.as_string(cur), ChunkReader(chunks))
+                n_rows = cur.rowcount
+            except PostgresError as e:
+                self._connection.rollback()
+                error = (GDTimeoutError if isinstance(e, QueryCanceledError)
+                         else GDExecutionError)
+                raise error("\nError copying into %s: %s" % (table, e))
+            else:
+                self._connection.commit()
+        return n_rows
+
+    def _scan_bounds(self, cur, table_id, key, partitions, boundaries,
+                     sample_percent):
+        """Returns the sorted keys splitting the rows of a table"""
+        if partitions == 1:
+            return []
+
+        sample = pgsql.SQL('')
+        if sample_percent is not None:
+            sample = pgsql.SQL(' TABLESAMPLE SYSTEM ({0})').format(
+                pgsql.Literal(sample_percent))
+
+        if boundaries == 'quantiles':
+            cur.execute(pgsql.SQL(
+                "SELECT percentile_disc(%s::float8[]) WITHIN GROUP "
+                "(ORDER BY {key}) FROM {table}{sample}").format(
+                    key=key, table=table_id, sample=sample),
+                [[i / partitions for i in range(1, partitions)]])
+            bounds = cur.fetchone()[0] or []
+        else:
+            cur.execute(pgsql.SQL(
+                "SELECT min({key}), max({key}) FROM {table}{sample}").format(
+                    key=key, table=table_id, sample=sample))
+            low, high = cur.fetchone()
+            if low is None:
+                return []
+            bounds = []
+            for i in range(1, partitions):
+                if isinstance(low, Integral):
+                    bounds.append(low + (high - low + 1) * i // partitions)
+                    continue
+                try:
+                    bounds.append(low + (high - low) * i / partitions)
+                except TypeError:
+                    raise TypeError(
+                        "Cannot split the range of the %s keys of column %s. "
+                        "Use boundaries='quantiles'"
+                        % (type(low).__name__, key.string))
+
+        unique = []
+        for bound in bounds:
+            if bound is not None and (not unique or bound != unique[-1]):
+                unique.append(bound)
+        return unique
+
+    def parallel_scan(self, table, key_column, partitions=4, columns=None,
+                      boundaries='range', sample_percent=None, snapshot=True,
+                      chunk_size=10000, timeout=None):
+        """Reads all the rows of a table with several concurrent connections
+
+        Parameters
+        ----------
+        table : str
+            The name of the table, optionally schema qualified
+        key_column : str
+            The column used to split the rows of the table in key ranges,
+            one per partition. It should be indexed
+        partitions : int, optional
+            The number of key ranges, each read by its own connection.
+            Default: 4
+        columns : list of str, optional
+            The columns read. Default: all the columns
+        boundaries : {'range', 'quantiles'}, optional
+            How the key ranges are chosen. 'range' splits the range between
+            the minimum and the maximum key evenly, which only works for
+            numeric, date and time keys and is best for evenly distributed
+            keys. 'quantiles' splits the keys in ranges with about the same
+            number of rows, sorting the keys. Default: 'range'
+        sample_percent : float, optional
+            If provided, the ranges are computed from a sample of this
+            percentage of the table blocks instead of the whole table, which
+            is faster but gives less balanced ranges
+        snapshot : bool, optional
+            If True, all the partitions are read in the same snapshot,
+            exported by the connection of the handler, so the rows are
+            consistent as if read by a single query. Default: True
+        chunk_size : int, optional
+            The maximum number of rows of each yielded chunk. Default: 10000
+        timeout : float, optional
+            Maximum number of seconds the key ranges can be computed, and
+            each partition can be read, before being cancelled. Defaults to
+            the handler's timeout
+
+        Returns
+        -------
+        generator of lists of rows
+            The rows of the table, in chunks of up to `chunk_size` rows, in
+            the order they arrive from the partitions
+
+        Raises
+        ------
+        ValueError
+            If `partitions` is lower than 1 or `boundaries` is not valid
+        TypeError
+            If `boundaries` is 'range' and the key range cannot be split
+        GDExecutionError
+            If there is some error reading the table
+        GDTimeoutError
+            If a query is cancelled for exceeding its timeout
+        GDConnectionError
+            If a partition cannot connect, e.g. if the pool of the handler
+            profile has fewer than `partitions` free connections
+
+        Notes
+        -----
+        Each partition is read by a new handler with the same configuration
+        as this one, through a server side cursor. So the partitions apply
+        the handler session profile, and each one is admitted in the handler
+        admission lane and recorded by its recorder as a separate call. As
+        the rows are yielded in chunks, the size limits of the handler do not
+        apply. The rows with a NULL key are read by the first partition. The
+        handler connection is held in a transaction until the generator is
+        exhausted or closed, so it should not be used in the meantime.
+
+        The arguments are validated when called, while the table is only
+        read once the generator is iterated.
+        """
+        if partitions < 1:
+            raise ValueError("partitions should be at least 1")
+        if boundaries not in ('range', 'quantiles'):
+            raise ValueError("boundaries should be 'range' or 'quantiles'")
+
+        table_id = table_identifier(table)
+        key = pgsql.Identifier(key_column)
+        select = pgsql.SQL('*') if columns is None else \
+            pgsql.SQL(', ').join(map(pgsql.Identifier, columns))
+        return self._parallel_scan(table, table_id, select, key, partitions,
+                                   boundaries, sample_percent, snapshot,
+                                   chunk_size, timeout)
+
+    def _parallel_scan(self, table, table_id, select, key, partitions,
+                       boundaries, sample_percent, snapshot, chunk_size,
+                       timeout):
+        """Generator of the chunks of `parallel_scan`"""
+        with self.get_postgres_cursor() as cur:
+            connection = self._connection
+            autocommit = connection.autocommit
+            try:
+                if snapshot:
+                    cur.execute("BEGIN ISOLATION LEVEL REPEATABLE READ"
+                                if autocommit else
+                                "SET TRANSACTION ISOLATION LEVEL "
+                                "REPEATABLE READ")
+                    cur.execute("SELECT pg_export_snapshot()")
+                    snapshot_id = cur.fetchone()[0]
+                else:
+                    snapshot_id = None
+                with self._deadline(timeout):
+                    bounds = self._scan_bounds(cur, table_id, key,
+                                               partitions, boundaries,
+                                               sample_percent)
+            except Exception as e:
+                if autocommit and snapshot:
+                    cur.execute("ROLLBACK")
+                else:
+                    connection.rollback()
+                if not isinstance(e, PostgresError):
+                    raise
+                error = (GDTimeoutError if isinstance(e, QueryCanceledError)
+                         else GDExecutionError)
+                raise error("\nError splitting %s: %s" % (table, e))
+
+        try:
+            for chunk in self._scan_partitions(table_id, select, key, bounds,
+                                               snapshot_id, chunk_size,
+                                               timeout):
+                yield chunk
+        finally:
+            # Release the snapshot once all the partitions are read
+            if connection.closed:
+                pass
+            elif autocommit and snapshot:
+                with connection.cursor() as cur:
+                    cur.execute("ROLLBACK")
+            else:
+                connection.rollback()
+
+    def _partition_handler(self):
+        """Returns a new handler with the same configuration as this one
+
+        Returns
+        -------
+        SQLConnectionHandler
+            The handler, with the same admin mode, connection and session
+            profiles, admission lane, recorder and defaults as this one
+        """
+        return SQLConnectionHandler(
+            admin=self.admin, profile=self.profile, timeout=self.timeout,
+            explain_sampler=self.explain_sampler,
+            result_cache=self.result_cache, recorder=self.recorder,
+            admission=self.admission, lane=self.lane,
+            detect_read_only=self.detect_read_only, max_rows=self.max_rows,
+            max_bytes=self.max_bytes, disk_cache=self.disk_cache,
+            session=self.session)
+
+    def _scan_partitions(self, table_id, select, key, bounds, snapshot_id,
+                         chunk_size, timeout):
+        """Reads each key range of a table in its own thread
+
+        The chunks are passed from the threads through a bounded queue, so
+        the threads wait while the consumer falls behind.
+        """
+        edges = [None] + bounds + [None]
+        ranges = []
+        for lower, upper in zip(edges[:-1], edges[1:]):
+            if lower is None and upper is None:
+                ranges.append((pgsql.SQL('TRUE'), []))
+            elif lower is None:
+                ranges.append((pgsql.SQL('{0} IS NULL OR {0} < %s').format(
+                    key), [upper]))
+            elif upper is None:
+                ranges.append((pgsql.SQL('{0} >= %s').format(key), [lower]))
+            else:
+                ranges.append((pgsql.SQL('{0} >= %s AND {0} < %s').format(
+                    key), [lower, upper]))
+
+        chunks = Queue(maxsize=2 * len(ranges))
+        stop = Event()
+
+        def put(item):
+            # Give up if the consumer stopped reading
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def scan(where, sql_args):
+            conn_handler = None
+            try:
+                conn_handler = self._partition_handler()
+                connection = conn_handler._connection
+                query = pgsql.SQL(
+                    "SELECT {select} FROM {table} WHERE {where}").format(
+                        select=select, table=table_id, where=where)
+                statements = [(query.as_string(connection), sql_args)]
+                try:
+                    with conn_handler._admitted(), \
+                            conn_handler._recording('execute', statements), \
+                            conn_handler._deadline(timeout):
+                        with connection.cursor() as cur:
+                            if snapshot_id is not None:
+                                cur.execute("SET TRANSACTION ISOLATION LEVEL "
+                                            "REPEATABLE READ")
+                                cur.execute("SET TRANSACTION SNAPSHOT %s",
+                                            [snapshot_id])
+                        with connection.cursor(
+                                'gd_parallel_scan',
+                                cursor_factory=DictCursor) as cur:
+                            cur.execute(query, sql_args)
+                            while not stop.is_set():
+                                rows = cur.fetchmany(chunk_size)
+                                if not rows or not put(rows):
+                                    break
+                    connection.rollback()
+                except PostgresError as e:
+                    connection.rollback()
+                    error = (GDTimeoutError
+                             if isinstance(e, QueryCanceledError)
+                             else GDExecutionError)
+                    raise error("\nError running SQL query: %s\nARGS: %s"
+                                "\nError: %s"
+                                % (query.as_string(connection),
+                                   str(sql_args), e))
+                put(_SCAN_DONE)
+            except Exception as e:
+                put(e)
+            finally:
+                if conn_handler is not None:
+                    conn_handler.close()
+
+        threads = [Thread(target=scan, args=(where, sql_args))
+                   for where, sql_args in ranges]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            remaining = len(threads)
+            while remaining:
+                item = chunks.get()
+                if item is _SCAN_DONE:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
     def _check_queue_exists(self, queue_name):
         if queue_name not in self.queues:
             raise KeyError("Queue %s does not exists" % queue_name)
@@ -438,17 +1750,48 @@ class SQLConnectionHandler(object):
         self._connection.rollback()
         # wipe out queue since it has an error in it
         del self.queues[queue]
-        raise GDExecutionError(
+        if isinstance(e, QueryCanceledError):
+            error = GDTimeoutError
+        elif isinstance(e, GDResultSizeError):
+            error = GDResultSizeError
+        else:
+            error = GDExecutionError
+        raise error(
             "\nError running SQL query in queue %s: %s\nARGS: %s\nError: %s"
             % (queue, sql, str(sql_args), e))
 
-    def execute_queue(self, queue):
+    def execute_queue(self, queue, timeout=None, max_rows=None,
+                      max_bytes=None, session=None):
         """Executes all sql in a queue in a single transaction block
 
         Parameters
         ----------
         queue : str
             Name of queue to execute
+        timeout : float, optional
+            Maximum number of seconds the whole transaction can run before
+            being cancelled. Defaults to the handler's timeout
+        max_rows : int, optional
+            Maximum number of rows fetched by all the SQL queries of the
+            queue. Defaults to the handler's max_rows
+        max_bytes : int, optional
+            Maximum approximate memory of the rows fetched by all the SQL
+            queries of the queue, in bytes. Defaults to the handler's
+            max_bytes
+        session : str, optional
+            The name of the session profile of the gd configuration applied
+            to the transaction of the call. Defaults to the handler's session
+            profile
+
+        Raises
+        ------
+        GDExecutionError
+            If there is some error executing the SQL queries
+        GDTimeoutError
+            If the transaction is cancelled for exceeding its timeout
+        GDResultSizeError
+            If the fetched rows exceed `max_rows` or `max_bytes`. The
+            transaction is rolled back
 
         Notes
         -----
@@ -458,10 +1801,20 @@ class SQLConnectionHandler(object):
         Queues are executed in FIFO order
         """
         self._check_queue_exists(queue)
+        session_query = self._session_query(session)
 
-        with self.get_postgres_cursor() as cur:
+        with self._admitted(), \
+                self._recording('queue', list(self.queues[queue])), \
+                self.get_postgres_cursor() as cur, self._deadline(timeout):
             results = []
             clear_res = False
+            n_rows = n_bytes = 0
+            if session_query is not None:
+                try:
+                    cur.execute(*session_query)
+                except PostgresError as e:
+                    self._rollback_raise_error(queue, session_query[0],
+                                               session_query[1], e)
             for sql, sql_args in self.queues[queue]:
                 if sql_args is not None:
                     # The user can provide a tuple, make sure that it
@@ -469,7 +1822,7 @@ class SQLConnectionHandler(object):
                     sql_args = list(sql_args)
                     for pos, arg in enumerate(sql_args):
                         # check if previous results needed and replace
-                        if isinstance(arg, str) and \
+                        if isinstance(arg, _TEXT_TYPES) and \
                                 arg[0] == "{" and arg[-1] == "}":
                             result_pos = int(arg[1:-1])
                             try:
@@ -491,7 +1844,8 @@ class SQLConnectionHandler(object):
 
                 # fetch results if available and append to results list
                 try:
-                    res = cur.fetchall()
+                    res, n_rows, n_bytes = self._fetch_all(
+                        cur, max_rows, max_bytes, n_rows, n_bytes)
                 except ProgrammingError as e:
                     # At this execution point, we don't know if the sql query
                     # that we executed was a INSERT or a SELECT. If it was a
@@ -499,12 +1853,14 @@ class SQLConnectionHandler(object):
                     # empty list. However, if it was a INSERT it will raise a
                     # ProgrammingError, so we catch that one and pass.
                     pass
-                except PostgresError as e:
+                except (PostgresError, GDResultSizeError) as e:
                     self._rollback_raise_error(queue, sql, sql_args, e)
                 else:
                     # append all results linearly
                     results.extend(flatten(res))
-        self._connection.commit()
+            self._connection.commit()
+        self.last_result_rows = n_rows
+        self.last_result_bytes = n_bytes
         # wipe out queue since finished
         del self.queues[queue]
         return results
@@ -0,0 +1,127 @@
+from threading import Event, Thread
+from time import sleep
+from unittest import TestCase, main
+
+from gd.admission import AdmissionController
+from gd.exceptions import GDAdmissionError
+from gd.sql_connection import SQLConnectionHandler
+
+
+class TestAdmissionController(TestCase):
+    def _hold(self, controller, lane, admitted, release):
+        """Starts a thread that holds a slot of lane until release is set"""
+        def run():
+            with controller.admit(lane):
+                admitted.append(lane)
+                release.wait()
+
+        thread = Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            sleep(0.01)
+        self.fail("Condition not reached")
+
+    def test_admit(self):
+        """admit runs the block and updates the metrics"""
+        controller = AdmissionController([('interactive', 2), ('batch', 1)])
+        with controller.admit('interactive'):
+            metrics = controller.metrics()
+            self.assertEqual(metrics['interactive']['in_flight'], 1)
+        metrics = controller.metrics()
+        self.assertEqual(metrics['interactive']['in_flight'], 0)
+        self.assertEqual(metrics['interactive']['admitted'], 1)
+        self.assertEqual(metrics['batch']['admitted'], 0)
+
+    def test_admit_unknown_lane(self):
+        """admit raises an error if the lane does not exist"""
+        controller = AdmissionController([('batch', 1)])
+        with self.assertRaises(KeyError):
+            with controller.admit('not a lane'):
+                pass
+
+    def test_admit_deadline(self):
+        """admit raises an error if the lane is full past the deadline"""
+        controller = AdmissionController([('batch', 1, 0.05)])
+        release = Event()
+        admitted = []
+        thread = self._hold(controller, 'batch', admitted, release)
+        self._wait_for(lambda: admitted)
+
+        with self.assertRaises(GDAdmissionError):
+            with controller.admit('batch'):
+                pass
+        with self.assertRaises(GDAdmissionError):
+            with controller.admit('batch', deadline=0.01):
+                pass
+        self.assertEqual(controller.metrics()['batch']['rejected'], 2)
+
+        release.set()
+        thread.join()
+        with controller.admit('batch'):
+            pass
+        self.assertEqual(controller.metrics()['batch']['admitted'], 2)
+
+    def test_admit_lane_limits(self):
+        """A full lane does not block the other lanes"""
+        controller = AdmissionController([('interactive', 1), ('batch', 1)])
+        release = Event()
+        admitted = []
+        thread = self._hold(controller, 'batch', admitted, release)
+        self._wait_for(lambda: admitted)
+        with controller.admit('interactive', deadline=1):
+            pass
+        release.set()
+        thread.join()
+
+    def test_admit_priority(self):
+        """Higher priority lanes are admitted first when slots free up"""
+        controller = AdmissionController([('interactive', 2), ('batch', 2)],
+                                         max_in_flight=1)
+        release = [Event(), Event(), Event()]
+        admitted = []
+        threads = [self._hold(controller, 'batch', admitted, release[0])]
+        self._wait_for(lambda: admitted)
+        threads.append(self._hold(controller, 'batch', admitted, release[1]))
+        self._wait_for(lambda: controller.metrics()['batch']['waiting'])
+        threads.append(self._hold(controller, 'interactive', admitted,
+                                  release[2]))
+        self._wait_for(
+            lambda: controller.metrics()['interactive']['waiting'])
+
+        release[0].set()
+        self._wait_for(lambda: len(admitted) == 2)
+        self.assertEqual(admitted, ['batch', 'interactive'])
+        release[2].set()
+        self._wait_for(lambda: len(admitted) == 3)
+        release[1].set()
+        for thread in threads:
+            thread.join()
+        metrics = controller.metrics()
+        self.assertTrue(metrics['batch']['wait_max'] > 0)
+        self.assertTrue(metrics['interactive']['wait_mean'] > 0)
+
+    def test_handler(self):
+        """The handler calls wait to be admitted in the handler lane"""
+        controller = AdmissionController([('interactive', 1, 0.05)])
+        with self.assertRaises(ValueError):
+            SQLConnectionHandler(admission=controller)
+
+        conn_handler = SQLConnectionHandler(admission=controller,
+                                            lane='interactive')
+        self.assertEqual(conn_handler.execute_fetchone("SELECT 1"), [1])
+        self.assertEqual(controller.metrics()['interactive']['admitted'], 1)
+
+        with controller.admit('interactive'):
+            with self.assertRaises(GDAdmissionError):
+                conn_handler.execute_fetchone("SELECT 1")
+        conn_handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from array import array
+from struct import pack
+from unittest import TestCase, main, skipIf
+
+from gd.binary_copy import (encode_columns, ChunkReader, COPY_HEADER,
+                            COPY_TRAILER, np)
+
+
+@skipIf(np is None, "NumPy is not installed")
+class TestEncodeColumns(TestCase):
+    def test_encode_columns(self):
+        """encode_columns encodes the rows in chunks"""
+        ints = np.array([1, -2, 3], dtype=np.int64)
+        floats = array('d', [0.5, 1.5, 2.5])
+        flags = np.array([True, False, True])
+        obs = list(encode_columns([ints, floats, flags], chunk_rows=2))
+
+        def row(i, f, b):
+            return (pack('>h', 3) + pack('>iq', 8, i) + pack('>id', 8, f) +
+                    pack('>i?', 1, b))
+
+        exp = [COPY_HEADER, row(1, 0.5, True) + row(-2, 1.5, False),
+               row(3, 2.5, True), COPY_TRAILER]
+        self.assertEqual(obs, exp)
+
+    def test_encode_columns_types(self):
+        """encode_columns keeps the size of each type"""
+        obs = b''.join(encode_columns([np.array([7], dtype=np.int16),
+                                       np.array([7], dtype=np.int32),
+                                       np.array([7], dtype=np.float32)]))
+        exp = (COPY_HEADER + pack('>h', 3) + pack('>ih', 2, 7) +
+               pack('>ii', 4, 7) + pack('>if', 4, 7) + COPY_TRAILER)
+        self.assertEqual(obs, exp)
+
+    def test_encode_columns_empty(self):
+        """encode_columns works without rows"""
+        obs = b''.join(encode_columns([np.array([], dtype=np.int32)]))
+        self.assertEqual(obs, COPY_HEADER + COPY_TRAILER)
+
+    def test_encode_columns_error(self):
+        """encode_columns raises an error with invalid columns"""
+        with self.assertRaises(ValueError):
+            encode_columns([np.arange(3), np.arange(2)])
+        with self.assertRaises(ValueError):
+            encode_columns([np.zeros((2, 2))])
+        with self.assertRaises(TypeError):
+            encode_columns([np.array(['a', 'b'])])
+        with self.assertRaises(TypeError):
+            encode_columns([np.arange(3, dtype=np.uint32)])
+        with self.assertRaises(ValueError):
+            encode_columns([np.arange(3)], chunk_rows=0)
+
+
+class TestChunkReader(TestCase):
+    def test_read(self):
+        """read returns a chunk at a time"""
+        reader = ChunkReader(iter([b'ab', b'cde']))
+        self.assertEqual(reader.read(1), b'ab')
+        self.assertEqual(reader.read(), b'cde')
+        self.assertEqual(reader.read(), b'')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from unittest import TestCase, main
+
+from gd.cache import ResultCache
+
+
+class TestResultCache(TestCase):
+    def test_get_put(self):
+        """get returns the cached values and counts hits and misses"""
+        cache = ResultCache()
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 'default'), 'default')
+        cache.put('a', [1])
+        cache.put(('sql', 2), None)
+        self.assertEqual(cache.get('a'), [1])
+        self.assertEqual(cache.get(('sql', 2), 'default'), None)
+        self.assertEqual(len(cache), 2)
+        self.assertTrue('a' in cache)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_max_size(self):
+        """The least recently used entries are evicted"""
+        cache = ResultCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertFalse('b' in cache)
+        self.assertTrue('a' in cache)
+        self.assertTrue('c' in cache)
+
+    def test_invalidate(self):
+        """invalidate removes a single entry"""
+        cache = ResultCache()
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.invalidate('a')
+        cache.invalidate('not cached')
+        self.assertFalse('a' in cache)
+        self.assertTrue('b' in cache)
+
+    def test_clear(self):
+        """clear removes all the entries"""
+        cache = ResultCache()
+        cache.put('a', 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    main()
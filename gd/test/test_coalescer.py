@@ -0,0 +1,131 @@
+from threading import Thread
+from time import sleep
+from unittest import TestCase, main
+
+from gd.coalescer import WriteCoalescer
+from gd.exceptions import GDBufferFullError, GDExecutionError
+from gd.sql_connection import SQLConnectionHandler
+
+INSERT = "INSERT INTO gd_coalescer_test (id, name) VALUES (%s, %s)"
+
+
+class TestWriteCoalescer(TestCase):
+    def setUp(self):
+        self.conn_handler = SQLConnectionHandler()
+        self.conn_handler.execute(
+            "CREATE TABLE gd_coalescer_test (id int PRIMARY KEY, "
+            "name varchar NOT NULL)")
+        self.coalescer = None
+
+    def tearDown(self):
+        if self.coalescer is not None:
+            self.coalescer.close()
+        self.conn_handler.execute("DROP TABLE gd_coalescer_test")
+        self.conn_handler.close()
+
+    def _ids(self):
+        return [row[0] for row in self.conn_handler.execute_fetchall(
+            "SELECT id FROM gd_coalescer_test ORDER BY id")]
+
+    def test_submit_max_delay(self):
+        """The buffered rows are written after max_delay"""
+        self.coalescer = WriteCoalescer(max_rows=100, max_delay=0.05)
+        pending = self.coalescer.submit(INSERT, [1, 'a'])
+        self.assertTrue(pending.wait(5))
+        self.assertTrue(pending.done())
+        self.assertEqual(self._ids(), [1])
+
+    def test_submit_max_rows(self):
+        """The buffered rows are written once max_rows are buffered"""
+        self.coalescer = WriteCoalescer(max_rows=3, max_delay=60)
+        pending = [self.coalescer.submit(INSERT, [i, 'a']) for i in range(3)]
+        for row in pending:
+            self.assertTrue(row.wait(5))
+        self.assertEqual(self._ids(), [0, 1, 2])
+
+    def test_submit_many_threads(self):
+        """The rows of many threads are written"""
+        self.coalescer = WriteCoalescer(max_rows=50, max_delay=0.01)
+
+        def submit(start):
+            for i in range(start, start + 100):
+                self.coalescer.submit(INSERT, (i, 'a'))
+
+        threads = [Thread(target=submit, args=(i * 100,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.coalescer.flush()
+        self.assertEqual(self._ids(), list(range(400)))
+
+    def test_submit_errors(self):
+        """Only the failing rows are rejected, with their own error"""
+        self.coalescer = WriteCoalescer(max_rows=100, max_delay=60)
+        ok = self.coalescer.submit(INSERT, [1, 'a'])
+        duplicated = self.coalescer.submit(INSERT, [1, 'b'])
+        null = self.coalescer.submit(INSERT, [2, None])
+        missing_arg = self.coalescer.submit(INSERT, [3])
+        other = self.coalescer.submit(
+            "INSERT INTO gd_coalescer_test (id, name) VALUES (%s, 'c')", [4])
+        self.coalescer.flush()
+
+        self.assertTrue(ok.wait())
+        self.assertTrue(other.wait())
+        for row in (duplicated, null, missing_arg):
+            with self.assertRaises(GDExecutionError):
+                row.wait()
+            self.assertIsNotNone(row.error)
+        self.assertEqual(self._ids(), [1, 4])
+
+    def test_submit_malformed(self):
+        """Malformed rows are rejected without affecting later batches"""
+        self.coalescer = WriteCoalescer(max_rows=100, max_delay=60)
+        ok = self.coalescer.submit(INSERT, [1, 'a'])
+        malformed = self.coalescer.submit(
+            "INSERT INTO gd_coalescer_test (id, name) VALUES (%s, '100%')",
+            [2])
+        self.coalescer.flush()
+        self.assertTrue(ok.wait())
+        with self.assertRaises(GDExecutionError):
+            malformed.wait()
+
+        later = self.coalescer.submit(INSERT, [3, 'c'])
+        self.coalescer.flush()
+        self.assertTrue(later.wait())
+        self.assertEqual(self._ids(), [1, 3])
+
+    def test_submit_back_pressure(self):
+        """submit blocks while the buffer is full"""
+        self.coalescer = WriteCoalescer(max_rows=100, max_delay=60,
+                                        max_pending=2)
+        self.coalescer.submit(INSERT, [1, 'a'])
+        self.coalescer.submit(INSERT, [2, 'a'])
+        with self.assertRaises(GDBufferFullError):
+            self.coalescer.submit(INSERT, [3, 'a'], timeout=0.05)
+
+        def flush():
+            sleep(0.05)
+            self.coalescer.flush()
+
+        thread = Thread(target=flush)
+        thread.start()
+        self.coalescer.submit(INSERT, [3, 'a'], timeout=5)
+        thread.join()
+        self.coalescer.flush()
+        self.assertEqual(self._ids(), [1, 2, 3])
+
+    def test_close(self):
+        """close writes the buffered rows"""
+        coalescer = WriteCoalescer(max_rows=100, max_delay=60)
+        pending = coalescer.submit(INSERT, [1, 'a'])
+        coalescer.close()
+        self.assertTrue(pending.done())
+        self.assertEqual(self._ids(), [1])
+        with self.assertRaises(ValueError):
+            coalescer.submit(INSERT, [2, 'a'])
+        coalescer.close()
+
+
+if __name__ == "__main__":
+    main()
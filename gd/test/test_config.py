@@ -0,0 +1,108 @@
+from os import environ, close, remove
+from tempfile import mkstemp
+from unittest import TestCase, main
+
+from gd.config import GDConfig
+
+CONFIG = """[postgres]
+USER = postgres
+ADMIN_USER = admin
+DATABASE = sql_handler_test
+HOST = localhost
+PORT = 5432
+PASSWORD =
+ADMIN_PASSWORD = secret
+
+[postgres:reporting]
+DATABASE = reporting
+HOST = reporting.example.org
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+
+[postgres:shard1]
+DATABASE = shard1
+
+[sharding]
+SHARDS = default, shard1
+
+[session:report]
+WORK_MEM = 256MB
+search_path = "$user", public
+"""
+
+
+class TestGDConfig(TestCase):
+    def setUp(self):
+        fd, self.conf_fp = mkstemp(suffix='.txt')
+        close(fd)
+        with open(self.conf_fp, 'w') as f:
+            f.write(CONFIG)
+        self._old_conf_fp = environ.get('GD_CONFIG_FP')
+        environ['GD_CONFIG_FP'] = self.conf_fp
+
+    def tearDown(self):
+        if self._old_conf_fp is None:
+            del environ['GD_CONFIG_FP']
+        else:
+            environ['GD_CONFIG_FP'] = self._old_conf_fp
+        remove(self.conf_fp)
+
+    def test_init(self):
+        """init reads the default profile"""
+        obs = GDConfig()
+        self.assertEqual(obs.user, 'postgres')
+        self.assertEqual(obs.password, None)
+        self.assertEqual(obs.database, 'sql_handler_test')
+        self.assertEqual(obs.host, 'localhost')
+        self.assertEqual(obs.port, 5432)
+        self.assertEqual(obs.admin_user, 'admin')
+        self.assertEqual(obs.admin_password, 'secret')
+
+        default = obs.profiles['default']
+        self.assertEqual(default.name, 'default')
+        self.assertEqual(default.database, 'sql_handler_test')
+        self.assertEqual(default.pool_min_size, 0)
+        self.assertEqual(default.pool_max_size, 0)
+
+    def test_init_profiles(self):
+        """init reads the named profiles, falling back to the default one"""
+        obs = GDConfig()
+        self.assertEqual(sorted(obs.profiles),
+                         ['default', 'reporting', 'shard1'])
+
+        profile = obs.profiles['reporting']
+        self.assertEqual(profile.name, 'reporting')
+        self.assertEqual(profile.database, 'reporting')
+        self.assertEqual(profile.host, 'reporting.example.org')
+        self.assertEqual(profile.pool_min_size, 1)
+        self.assertEqual(profile.pool_max_size, 10)
+        # Inherited from the default profile
+        self.assertEqual(profile.user, 'postgres')
+        self.assertEqual(profile.password, None)
+        self.assertEqual(profile.port, 5432)
+        self.assertEqual(profile.admin_password, 'secret')
+
+    def test_init_shards(self):
+        """init reads the shard profiles"""
+        obs = GDConfig()
+        self.assertEqual(obs.shards, ['default', 'shard1'])
+        self.assertEqual(obs.profiles['shard1'].database, 'shard1')
+
+    def test_init_sessions(self):
+        """init reads the session profiles"""
+        obs = GDConfig()
+        self.assertEqual(obs.sessions, {'report': {
+            'work_mem': '256MB', 'search_path': '"$user", public'}})
+
+    def test_init_shards_error(self):
+        """init raises an error if a shard profile is not defined"""
+        with open(self.conf_fp) as f:
+            conf = f.read().replace("default, shard1", "default, shard2")
+        with open(self.conf_fp, 'w') as f:
+            f.write(conf)
+        with self.assertRaises(ValueError):
+            GDConfig()
+
+
+if __name__ == "__main__":
+    main()
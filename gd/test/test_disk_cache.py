@@ -0,0 +1,141 @@
+from datetime import date, datetime
+from decimal import Decimal
+from os import listdir
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase, main, skipIf
+
+from gd import disk_cache
+from gd.disk_cache import DiskCache, np, to_columns
+
+
+@skipIf(np is None, "NumPy is not installed")
+class TestToColumns(TestCase):
+    def test_to_columns(self):
+        """to_columns converts the values of each column to arrays"""
+        obs = to_columns(
+            ['i', 'f', 's', 'b', 'd', 't', 'n', 'x'],
+            [(1, 0.5, 'a', True, date(2014, 1, 2),
+              datetime(2014, 1, 2, 3, 4), None, Decimal('1.5')),
+             (None, 1.5, 'bc', False, None, datetime(2014, 1, 2), None,
+              Decimal('2'))])
+        self.assertEqual(list(obs), ['i', 'f', 's', 'b', 'd', 't', 'n', 'x'])
+        self.assertEqual(obs['i'].dtype, np.int64)
+        self.assertEqual(obs['i'].tolist(), [1, None])
+        self.assertEqual(obs['f'].tolist(), [0.5, 1.5])
+        self.assertFalse(np.ma.is_masked(obs['f']))
+        self.assertEqual(obs['s'].tolist(), ['a', 'bc'])
+        self.assertEqual(obs['b'].dtype, np.bool_)
+        self.assertEqual(obs['d'].dtype, np.dtype('datetime64[D]'))
+        self.assertEqual(obs['d'].tolist(), [date(2014, 1, 2), None])
+        self.assertEqual(obs['t'].dtype, np.dtype('datetime64[us]'))
+        self.assertEqual(obs['n'].tolist(), [None, None])
+        self.assertEqual(obs['x'].dtype, object)
+
+    def test_to_columns_arrays(self):
+        """to_columns keeps array values in one-dimensional object arrays"""
+        obs = to_columns(['a', 'r'], [([1, 2], [1]), ([3, 4], None),
+                                      ([5, 6], [2, 3])])
+        for name in ('a', 'r'):
+            self.assertEqual(obs[name].dtype, object)
+            self.assertEqual(obs[name].shape, (3,))
+        self.assertEqual(obs['a'].tolist(), [[1, 2], [3, 4], [5, 6]])
+        self.assertEqual(obs['r'].tolist(), [[1], None, [2, 3]])
+
+    def test_to_columns_empty(self):
+        """to_columns converts empty results"""
+        obs = to_columns(['a'], [])
+        self.assertEqual(len(obs['a']), 0)
+
+
+@skipIf(np is None, "NumPy is not installed")
+class TestDiskCache(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.cache = DiskCache(self.directory)
+        self.columns = to_columns(['a', 'b'], [(1, 'x'), (None, 'y')])
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_get_put(self):
+        """get returns the results cached by any DiskCache"""
+        self.assertEqual(self.cache.get("SELECT 1"), None)
+        self.assertTrue(self.cache.put("SELECT %s", [1], self.columns))
+
+        obs = DiskCache(self.directory).get("SELECT %s", (1,))
+        self.assertEqual(list(obs), ['a', 'b'])
+        self.assertEqual(obs['a'].tolist(), [1, None])
+        self.assertEqual(obs['b'].tolist(), ['x', 'y'])
+        # The data is memory mapped
+        self.assertTrue(isinstance(np.ma.getdata(obs['b']), np.memmap))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+        # Arguments and versions are part of the key
+        self.assertEqual(self.cache.get("SELECT %s", [2]), None)
+        self.assertEqual(self.cache.get("SELECT %s", [1], version='v2'),
+                         None)
+        self.cache.put("SELECT %s", [1], to_columns(['c'], [(3,)]),
+                       version='v2')
+        self.assertEqual(
+            self.cache.get("SELECT %s", [1], version='v2')['c'].tolist(), [3])
+        self.assertEqual(self.cache.get("SELECT %s", [1])['a'][0], 1)
+
+        empty = to_columns(['c'], [])
+        self.assertTrue(self.cache.put("SELECT 2", None, empty))
+        self.assertEqual(len(self.cache.get("SELECT 2")['c']), 0)
+
+    def test_put_not_cached(self):
+        """put does not cache object columns nor too large results"""
+        columns = to_columns(['x'], [(Decimal(1),)])
+        self.assertFalse(self.cache.put("SELECT 1", None, columns))
+        columns = to_columns(['a'], [([1, 2],), ([3, 4],)])
+        self.assertFalse(self.cache.put("SELECT 1", None, columns))
+        cache = DiskCache(self.directory, max_bytes=8)
+        self.assertFalse(cache.put("SELECT 1", None,
+                                   to_columns(['a'], [(1,), (2,)])))
+        self.assertEqual(listdir(self.directory), [])
+
+    def test_put_rename_error(self):
+        """put does not report as cached a result it could not write"""
+        def rename(src, dst):
+            raise OSError()
+
+        original = disk_cache.rename
+        disk_cache.rename = rename
+        try:
+            self.assertFalse(self.cache.put("SELECT 1", None, self.columns))
+        finally:
+            disk_cache.rename = original
+        self.assertEqual(listdir(self.directory), [])
+        self.assertIsNone(self.cache.get("SELECT 1"))
+
+    def test_eviction(self):
+        """The least recently used results are evicted"""
+        self.cache.put("SELECT 1", None, self.columns)
+        size = self.cache.size()
+        cache = DiskCache(self.directory, max_bytes=2 * size)
+        cache.put("SELECT 2", None, self.columns)
+        # Make SELECT 1 the most recently used
+        cache.get("SELECT 1")
+        cache.put("SELECT 3", None, self.columns)
+        self.assertTrue(cache.size() <= 2 * size)
+        self.assertEqual(cache.get("SELECT 2"), None)
+        self.assertNotEqual(cache.get("SELECT 1"), None)
+        self.assertNotEqual(cache.get("SELECT 3"), None)
+
+    def test_invalidate(self):
+        """invalidate and clear remove the cached results"""
+        self.cache.put("SELECT 1", None, self.columns)
+        self.cache.put("SELECT 2", None, self.columns, version='v1')
+        self.cache.invalidate("SELECT 2")
+        self.assertNotEqual(self.cache.get("SELECT 2", version='v1'), None)
+        self.cache.invalidate("SELECT 2", version='v1')
+        self.assertEqual(self.cache.get("SELECT 2", version='v1'), None)
+        self.cache.clear()
+        self.assertEqual(self.cache.get("SELECT 1"), None)
+        self.assertEqual(self.cache.size(), 0)
+
+
+if __name__ == "__main__":
+    main()
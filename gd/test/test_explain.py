@@ -0,0 +1,62 @@
+from unittest import TestCase, main
+
+from gd.explain import ExplainSampler
+
+
+def _plan(node_type, rows, removed=0, loops=1, relation='test_table'):
+    return {'Node Type': node_type, 'Relation Name': relation,
+            'Actual Rows': rows, 'Rows Removed by Filter': removed,
+            'Actual Loops': loops}
+
+
+class TestExplainSampler(TestCase):
+    def test_should_explain_threshold(self):
+        """should_explain captures all the calls over the threshold"""
+        sampler = ExplainSampler(threshold=0.5)
+        self.assertTrue(sampler.should_explain(0.5))
+        self.assertTrue(sampler.should_explain(2))
+        self.assertFalse(sampler.should_explain(0.1))
+
+    def test_should_explain_sample_rate(self):
+        """should_explain follows the sample rate"""
+        self.assertFalse(ExplainSampler().should_explain(10))
+        self.assertTrue(ExplainSampler(sample_rate=1).should_explain(0))
+
+    def test_max_plans(self):
+        """Only the most recent plans are kept"""
+        sampler = ExplainSampler(max_plans=2)
+        for i in range(3):
+            sampler.plans.append({'sql': str(i), 'plan': None})
+        self.assertEqual([p['sql'] for p in sampler.plans], ['1', '2'])
+
+    def test_seq_scan_report(self):
+        """seq_scan_report aggregates the large sequential scans"""
+        join = _plan('Hash Join', 10)
+        join['Plans'] = [_plan('Seq Scan', 5, removed=20000),
+                         _plan('Index Scan', 50000, relation='other')]
+        sampler = ExplainSampler()
+        sampler.plans.extend([
+            {'sql': 'SELECT 1', 'duration': 0.5, 'plan': {'Plan': join}},
+            {'sql': 'SELECT 1', 'duration': 0.7,
+             'plan': {'Plan': _plan('Seq Scan', 10, loops=3000)}},
+            {'sql': 'SELECT 2', 'duration': 1,
+             'plan': {'Plan': _plan('Seq Scan', 10)}},
+            {'sql': 'SELECT 3', 'duration': 1, 'plan': None}])
+
+        obs = sampler.seq_scan_report(min_rows=1000)
+        exp = [{'sql': 'SELECT 1', 'relation': 'test_table', 'rows': 30000,
+                'samples': 2, 'duration': 0.7}]
+        self.assertEqual(obs, exp)
+
+        self.assertEqual(len(sampler.seq_scan_report(min_rows=1)), 2)
+
+    def test_clear(self):
+        """clear discards all the plans"""
+        sampler = ExplainSampler()
+        sampler.plans.append({'sql': 'SELECT 1', 'plan': None})
+        sampler.clear()
+        self.assertEqual(len(sampler.plans), 0)
+
+
+if __name__ == "__main__":
+    main()
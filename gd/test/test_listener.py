@@ -0,0 +1,163 @@
+from copy import copy
+from select import select
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Event
+from time import time
+from unittest import TestCase, main, skipIf
+
+from gd import gd_config
+from gd.cache import ResultCache
+from gd.disk_cache import DiskCache, np, to_columns
+from gd.listener import NotificationListener
+from gd.pool import close_pools
+from gd.sql_connection import SQLConnectionHandler
+
+
+class TestNotificationListener(TestCase):
+    def setUp(self):
+        self.listener = NotificationListener()
+        self.conn_handler = SQLConnectionHandler()
+
+    def tearDown(self):
+        self.listener.close()
+        self.conn_handler.close()
+
+    def _notify(self, channel, payload=''):
+        self.conn_handler.execute("SELECT pg_notify(%s, %s)",
+                                  [channel, payload])
+
+    def _dispatch_until(self, condition):
+        """Dispatches the notifications until condition is met"""
+        # Notifications from other connections arrive asynchronously
+        end = time() + 5
+        while time() < end:
+            select([self.listener], [], [], 0.05)
+            self.listener.dispatch()
+            if condition():
+                return
+        self.fail("Notifications not received")
+
+    def test_dispatch(self):
+        """dispatch calls the callbacks of the received notifications"""
+        received = []
+        self.listener.subscribe('gd_test', received.append)
+        self.listener.subscribe('gd_Other', received.append)
+        self._notify('gd_test', 'payload')
+        self._notify('gd_Other')
+        self._notify('gd_not_subscribed')
+        self._dispatch_until(lambda: len(received) == 2)
+        self.assertEqual([(n.channel, n.payload) for n in received],
+                         [('gd_test', 'payload'), ('gd_Other', '')])
+
+    def test_dispatch_callback_error(self):
+        """A failing callback does not prevent running the other ones"""
+        def fail(notify):
+            raise ValueError()
+
+        received = []
+        self.listener.subscribe('gd_test', fail)
+        self.listener.subscribe('gd_test', received.append)
+        self._notify('gd_test')
+        self._dispatch_until(lambda: received)
+        self.assertEqual(len(received), 1)
+
+    def test_unsubscribe(self):
+        """unsubscribe stops dispatching the notifications"""
+        received = []
+        other = []
+        self.listener.subscribe('gd_test', received.append)
+        self.listener.subscribe('gd_test', other.append)
+        self.listener.unsubscribe('gd_test', other.append)
+        self._notify('gd_test')
+        self._dispatch_until(lambda: received)
+        self.assertEqual((len(received), len(other)), (1, 0))
+
+        self.listener.unsubscribe('gd_test')
+        self.listener.subscribe('gd_other', received.append)
+        self._notify('gd_test')
+        self._notify('gd_other')
+        self._dispatch_until(lambda: len(received) == 2)
+        self.assertEqual(received[1].channel, 'gd_other')
+
+        with self.assertRaises(KeyError):
+            self.listener.unsubscribe('gd_test')
+
+    def test_start_stop(self):
+        """The background thread dispatches the notifications"""
+        received = []
+        event = Event()
+
+        def callback(notify):
+            received.append(notify.payload)
+            event.set()
+
+        self.listener.subscribe('gd_test', callback)
+        self.listener.start()
+        self._notify('gd_test', 'first')
+        self.assertTrue(event.wait(5))
+        self.listener.stop()
+        self.assertEqual(received, ['first'])
+        self.assertIsNone(self.listener.error)
+
+    def test_invalidate_on(self):
+        """invalidate_on evicts cache entries from the payload"""
+        cache = ResultCache()
+        cache.put(('sql', 1), 'a')
+        cache.put(('sql', 2), 'b')
+        self.listener.invalidate_on('gd_test', cache,
+                                    key=lambda p: ('sql', int(p)))
+        self._notify('gd_test', '1')
+        self._dispatch_until(lambda: ('sql', 1) not in cache)
+        self.assertTrue(('sql', 2) in cache)
+
+        # An empty payload clears the whole cache
+        self._notify('gd_test')
+        self._dispatch_until(lambda: len(cache) == 0)
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_invalidate_on_disk_cache(self):
+        """invalidate_on evicts the DiskCache results from the payload"""
+        directory = mkdtemp()
+        try:
+            cache = DiskCache(directory)
+            sql = "SELECT * FROM test_table WHERE int_column = %s"
+            columns = to_columns(['a'], [(1,)])
+            for version in ('1', '2'):
+                cache.put(sql, [1], columns, version=version)
+            self.listener.invalidate_on(
+                'gd_test', cache, key=lambda p: (sql, [1], p))
+            self._notify('gd_test', '1')
+            self._dispatch_until(
+                lambda: cache.get(sql, [1], version='1') is None)
+            self.assertIsNotNone(cache.get(sql, [1], version='2'))
+        finally:
+            rmtree(directory)
+
+    def test_close_pooled(self):
+        """close stops listening before returning the connection to the pool
+        """
+        profile = copy(gd_config.profiles['default'])
+        profile.name = 'pooled'
+        profile.pool_min_size = 1
+        profile.pool_max_size = 1
+        gd_config.profiles['pooled'] = profile
+        try:
+            listener = NotificationListener(profile='pooled')
+            listener.subscribe('gd_test', lambda notify: None)
+            connection = listener._connection
+            listener.close()
+            listener.close()
+
+            obs = SQLConnectionHandler(profile='pooled')
+            self.assertIs(obs._connection, connection)
+            self.assertEqual(obs.execute_fetchall(
+                "SELECT * FROM pg_listening_channels()"), [])
+            obs.close()
+        finally:
+            del gd_config.profiles['pooled']
+            close_pools()
+
+
+if __name__ == "__main__":
+    main()
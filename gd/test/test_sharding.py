@@ -0,0 +1,144 @@
+from copy import copy
+from unittest import TestCase, main
+from zlib import crc32
+
+from psycopg2 import connect
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from gd import gd_config
+from gd.exceptions import GDConnectionError, GDExecutionError
+from gd.sharding import ShardedConnectionHandler
+
+SHARD_DB = 'sql_handler_test_shard'
+
+
+class TestShardedConnectionHandler(TestCase):
+    def _admin_execute(self, sql):
+        con = connect(user=gd_config.admin_user,
+                      password=gd_config.admin_password, host=gd_config.host,
+                      port=gd_config.port)
+        con.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with con.cursor() as cur:
+            cur.execute(sql)
+        con.close()
+
+    def setUp(self):
+        # The first shard is the test database and the second one an
+        # additional database in the same server
+        self._admin_execute("DROP DATABASE IF EXISTS %s" % SHARD_DB)
+        self._admin_execute("CREATE DATABASE %s" % SHARD_DB)
+        profile = copy(gd_config.profiles['default'])
+        profile.name = 'gd_test_shard'
+        profile.database = SHARD_DB
+        gd_config.profiles['gd_test_shard'] = profile
+
+        self.conn_handler = ShardedConnectionHandler(
+            shards=['default', 'gd_test_shard'])
+        for conn_handler in self.conn_handler.handlers:
+            conn_handler.execute("CREATE TABLE IF NOT EXISTS gd_shard_test "
+                                 "(tenant int, name varchar)")
+            conn_handler.execute("DELETE FROM gd_shard_test")
+
+    def tearDown(self):
+        self.conn_handler.handlers[0].execute("DROP TABLE gd_shard_test")
+        self.conn_handler.close()
+        del gd_config.profiles['gd_test_shard']
+        self._admin_execute("DROP DATABASE %s" % SHARD_DB)
+
+    def _insert(self, tenants):
+        for tenant in tenants:
+            self.conn_handler.execute(
+                tenant, "INSERT INTO gd_shard_test VALUES (%s, %s)",
+                [tenant, 'name %d' % tenant])
+
+    def test_init_error(self):
+        """init raises an error without shards"""
+        with self.assertRaises(GDConnectionError):
+            ShardedConnectionHandler(shards=[])
+        with self.assertRaises(GDConnectionError):
+            ShardedConnectionHandler(shards=['default', 'not a profile'])
+
+    def test_shard_for(self):
+        """shard_for is stable and spreads the keys across the shards"""
+        obs = [self.conn_handler.shard_for(k) for k in range(100)]
+        self.assertEqual(obs, [self.conn_handler.shard_for(k)
+                               for k in range(100)])
+        self.assertEqual(set(obs), {0, 1})
+        self.assertEqual(self.conn_handler.shard_for(1),
+                         self.conn_handler.shard_for('1'))
+        # Non-ASCII text keys are hashed as UTF-8
+        key = u'tenant \xe9\u20ac'
+        self.assertEqual(self.conn_handler.shard_for(key),
+                         (crc32(key.encode('utf-8')) & 0xffffffff) % 2)
+        self.assertIs(self.conn_handler.handler_for(1),
+                      self.conn_handler.handlers[
+                          self.conn_handler.shard_for(1)])
+
+    def test_execute_routing(self):
+        """The calls run in the node of their shard key"""
+        tenants = list(range(10))
+        self._insert(tenants)
+        for tenant in tenants:
+            obs = self.conn_handler.execute_fetchone(
+                tenant, "SELECT name FROM gd_shard_test WHERE tenant = %s",
+                [tenant])
+            self.assertEqual(obs, ['name %d' % tenant])
+            # The other node does not have it
+            other = self.conn_handler.handlers[
+                1 - self.conn_handler.shard_for(tenant)]
+            self.assertEqual(other.execute_fetchall(
+                "SELECT * FROM gd_shard_test WHERE tenant = %s", [tenant]),
+                [])
+
+        obs = self.conn_handler.execute_fetchall(
+            3, "SELECT tenant FROM gd_shard_test ORDER BY tenant")
+        self.assertTrue([3] in obs)
+        self.assertTrue(len(obs) < 10)
+
+    def test_executemany_queue(self):
+        """executemany and queues run in the node of their shard key"""
+        self.conn_handler.executemany(
+            5, "INSERT INTO gd_shard_test VALUES (%s, %s)",
+            [(5, 'a'), (5, 'b')])
+        self.conn_handler.create_queue(5, 'queue')
+        self.conn_handler.add_to_queue(
+            5, 'queue', "UPDATE gd_shard_test SET name = 'c' "
+            "WHERE tenant = %s AND name = %s RETURNING name", [5, 'a'])
+        self.assertEqual(self.conn_handler.execute_queue(5, 'queue'), ['c'])
+        self.assertEqual(self.conn_handler.execute_fetchall(
+            5, "SELECT name FROM gd_shard_test ORDER BY name"),
+            [['b'], ['c']])
+
+    def test_scatter_fetchall(self):
+        """scatter_fetchall merges the results of all the nodes"""
+        self._insert(range(10))
+        obs = self.conn_handler.scatter_fetchall(
+            "SELECT tenant FROM gd_shard_test WHERE tenant > %s", [2])
+        self.assertEqual(sorted(row[0] for row in obs), list(range(3, 10)))
+
+        with self.assertRaises(GDExecutionError):
+            self.conn_handler.scatter_fetchall("SELECT * FROM not_a_table")
+
+    def test_session(self):
+        """The session profiles are applied in the nodes"""
+        gd_config.sessions['report'] = {'work_mem': '64MB'}
+        try:
+            obs = self.conn_handler.execute_fetchone(
+                1, "SHOW work_mem", session='report')
+            self.assertEqual(obs, ['64MB'])
+            obs = self.conn_handler.scatter_fetchall(
+                "SHOW work_mem", session='report')
+            self.assertEqual(obs, [['64MB'], ['64MB']])
+
+            conn_handler = ShardedConnectionHandler(
+                shards=['default', 'gd_test_shard'], session='report')
+            for node_handler in conn_handler.handlers:
+                self.assertEqual(node_handler.execute_fetchone(
+                    "SHOW work_mem"), ['64MB'])
+            conn_handler.close()
+        finally:
+            gd_config.sessions.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,27 @@
-from unittest import TestCase, main
+from array import array
+from copy import copy
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase, main, skipIf
 
 from psycopg2._psycopg import connection, cursor
 from psycopg2 import connect, ProgrammingError
+from psycopg2.sql import SQL, Literal
 from psycopg2.extensions import (ISOLATION_LEVEL_AUTOCOMMIT,
-                                 ISOLATION_LEVEL_READ_COMMITTED)
+                                 ISOLATION_LEVEL_READ_COMMITTED,
+                                 TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_INTRANS)
 
 from gd import gd_config
+from gd.admission import AdmissionController
+from gd.pool import close_pools
 from gd.sql_connection import SQLConnectionHandler
-from gd.exceptions import GDExecutionError, GDConnectionError
+from gd.explain import ExplainSampler
+from gd.cache import ResultCache
+from gd.disk_cache import DiskCache
+from gd.binary_copy import np
+from gd.exceptions import (GDExecutionError, GDConnectionError,
+                           GDResultSizeError, GDTimeoutError)
 
 
 DB_LAYOUT = """CREATE TABLE test_table (
@@ -56,6 +70,24 @@ class TestConnHandler(TestCase):
     def tearDown(self):
         # We need to delete the conn_handler, so the connection is closed
         del self.conn_handler
+        # Remove the profiles added by the tests and their pooled connections
+        for name in list(gd_config.profiles):
+            if name != 'default':
+                del gd_config.profiles[name]
+        close_pools()
+        gd_config.sessions.clear()
+
+    def _add_pooled_profile(self, name, min_size, max_size):
+        profile = copy(gd_config.profiles['default'])
+        profile.name = name
+        profile.pool_min_size = min_size
+        profile.pool_max_size = max_size
+        gd_config.profiles[name] = profile
+
+    def _add_sessions(self):
+        gd_config.sessions['report'] = {'work_mem': '64MB', 'jit': 'off'}
+        gd_config.sessions['oltp'] = {'work_mem': '1MB', 'jit': 'off',
+                                      'search_path': 'other, public'}
 
     def _populate_test_table(self):
         sql = ("INSERT INTO test_table (str_column, bool_column, int_column) "
@@ -89,6 +121,60 @@ class TestConnHandler(TestCase):
         self.assertEqual(obs.queues, {})
         self.assertTrue(isinstance(obs._connection, connection))
 
+    def test_init_timeout(self):
+        """init stores the default timeout"""
+        obs = SQLConnectionHandler(timeout=2.5)
+        self.assertEqual(obs.timeout, 2.5)
+        self.assertEqual(self.conn_handler.timeout, None)
+
+    def test_init_profile(self):
+        """init connects using the given profile"""
+        self.assertEqual(self.conn_handler.profile, 'default')
+        self.assertIsNone(self.conn_handler._pool)
+
+        self._add_pooled_profile('pooled', 1, 2)
+        obs = SQLConnectionHandler(profile='pooled')
+        self.assertEqual(obs.profile, 'pooled')
+        self.assertIsNotNone(obs._pool)
+        self.assertTrue(isinstance(obs._connection, connection))
+        self.assertEqual(obs.execute_fetchone("SELECT 1"), [1])
+
+    def test_init_profile_error(self):
+        """init raises an error if the profile does not exist"""
+        with self.assertRaises(GDConnectionError):
+            SQLConnectionHandler(profile='not a profile')
+
+    def test_close(self):
+        """close closes the connection and it is reopened on use"""
+        con = self.conn_handler._connection
+        self.conn_handler.close()
+        self.assertTrue(con.closed)
+        self.assertEqual(self.conn_handler.execute_fetchone("SELECT 1"), [1])
+
+    def test_close_pooled(self):
+        """close returns the connection to the profile pool"""
+        self._add_pooled_profile('pooled', 1, 2)
+        obs = SQLConnectionHandler(profile='pooled')
+        con = obs._connection
+        obs.autocommit = True
+        obs.close()
+        self.assertFalse(con.closed)
+        self.assertFalse(con.autocommit)
+
+        # The next handler reuses the connection
+        obs2 = SQLConnectionHandler(profile='pooled')
+        self.assertIs(obs2._connection, con)
+
+    def test_init_pool_exhausted(self):
+        """init raises an error if the profile pool is exhausted"""
+        self._add_pooled_profile('pooled', 0, 1)
+        obs = SQLConnectionHandler(profile='pooled')
+        with self.assertRaises(GDConnectionError) as cm:
+            SQLConnectionHandler(profile='pooled')
+        self.assertTrue("limited to 1 connections" in str(cm.exception))
+        obs.close()
+        SQLConnectionHandler(profile='pooled')
+
     def test_init_admin_error(self):
         """Init raises an error if admin is an unrecognized value"""
         with self.assertRaises(GDConnectionError):
@@ -142,6 +228,14 @@ class TestConnHandler(TestCase):
         self.assertEqual(self.conn_handler._connection.isolation_level,
                          ISOLATION_LEVEL_READ_COMMITTED)
 
+    def test_autocommit_closed(self):
+        """autocommit reopens the connection if the handler was closed"""
+        self.conn_handler.close()
+        self.assertFalse(self.conn_handler.autocommit)
+        self.conn_handler.close()
+        self.conn_handler.autocommit = True
+        self.assertTrue(self.conn_handler._connection.autocommit)
+
     def test_autocommit_setter_error(self):
         """autocommit raises an error if the parameter is not a boolean
         """
@@ -213,6 +307,76 @@ class TestConnHandler(TestCase):
 
         self._assert_sql_equal([('foo', True, 1), ('foo', True, 2)])
 
+    def test_execute_timeout(self):
+        """execute raises a timeout error if the query takes too long"""
+        with self.assertRaises(GDTimeoutError):
+            self.conn_handler.execute("SELECT pg_sleep(5)", timeout=0.1)
+
+        # The connection is still usable afterwards
+        sql = "INSERT INTO test_table (int_column) VALUES (%s)"
+        self.conn_handler.execute(sql, (1,), timeout=5)
+        self._assert_sql_equal([('foo', True, 1)])
+
+    def test_execute_handler_timeout(self):
+        """execute uses the handler timeout by default"""
+        conn_handler = SQLConnectionHandler(timeout=0.1)
+        with self.assertRaises(GDTimeoutError):
+            conn_handler.execute("SELECT pg_sleep(5)")
+        # The per call timeout overrides the handler one
+        conn_handler.execute("SELECT pg_sleep(0.2)", timeout=5)
+
+    def test_execute_explain_sampler(self):
+        """The plans of the read-only queries are captured"""
+        sampler = ExplainSampler(threshold=0)
+        conn_handler = SQLConnectionHandler(explain_sampler=sampler)
+        # Only the read-only queries are sampled
+        conn_handler.execute("CREATE SEQUENCE test_seq")
+        conn_handler.execute(
+            "INSERT INTO test_table (int_column) VALUES (nextval('test_seq'))")
+        sql = "SELECT * FROM test_table WHERE int_column = %s"
+        obs = conn_handler.execute_fetchall(sql, (1,))
+        self.assertEqual(obs, [['foo', True, 1]])
+
+        self._assert_sql_equal([('foo', True, 1)])
+        self.assertEqual(conn_handler.execute_fetchone(
+            "SELECT last_value FROM test_seq"), [1])
+        self.assertEqual(len(sampler.plans), 2)
+        self.assertEqual(sampler.plans[0]['sql'], sql)
+        self.assertEqual(sampler.plans[0]['sql_args'], (1,))
+        self.assertEqual(sampler.plans[0]['plan']['Plan']['Node Type'],
+                         'Seq Scan')
+        self.assertEqual(sampler.seq_scan_report(min_rows=1)[0]['relation'],
+                         'test_table')
+
+    def test_execute_explain_sampler_error(self):
+        """A failing EXPLAIN does not fail the call"""
+        sampler = ExplainSampler(threshold=0)
+        conn_handler = SQLConnectionHandler(explain_sampler=sampler)
+        # The sequence cannot be advanced again by the EXPLAIN
+        conn_handler.execute("CREATE SEQUENCE test_seq START 2 MAXVALUE 2")
+        self.assertEqual(conn_handler.execute_fetchall(
+            "SELECT nextval('test_seq')"), [[2]])
+        self.assertIsNone(sampler.plans[0]['plan'])
+        self.assertIsNotNone(sampler.plans[0]['error'])
+        conn_handler.close()
+
+    def test_execute_explain_sampler_timeout(self):
+        """The plans are captured once the call timeout no longer applies"""
+        sampler = ExplainSampler(threshold=0)
+        conn_handler = SQLConnectionHandler(explain_sampler=sampler)
+        conn_handler.execute_fetchall("SELECT 1 FROM pg_sleep(0.3)",
+                                      timeout=0.5)
+        self.assertIsNone(sampler.plans[0]['error'])
+        self.assertIsNotNone(sampler.plans[0]['plan'])
+
+    def test_execute_explain_sampler_composable(self):
+        """The queries composed with psycopg2.sql are not sampled"""
+        sampler = ExplainSampler(threshold=0)
+        conn_handler = SQLConnectionHandler(explain_sampler=sampler)
+        self.assertEqual(conn_handler.execute_fetchall(
+            SQL("SELECT {}").format(Literal(1))), [[1]])
+        self.assertEqual(len(sampler.plans), 0)
+
     def test_execute_fetchone_no_sql_args(self):
         """execute_fetchone works with no arguments"""
         self._populate_test_table()
@@ -249,6 +413,543 @@ class TestConnHandler(TestCase):
 
         self.assertEqual(obs, [['test1', True, 1], ['test2', True, 2]])
 
+    def test_execute_fetchall_size_limits(self):
+        """execute_fetchall enforces the result size limits"""
+        self._populate_test_table()
+        sql = "SELECT * FROM test_table ORDER BY int_column"
+
+        obs = self.conn_handler.execute_fetchall(sql, max_rows=4)
+        self.assertEqual(len(obs), 4)
+        self.assertEqual(self.conn_handler.last_result_rows, 4)
+        size = self.conn_handler.last_result_bytes
+        self.assertTrue(size > 0)
+
+        with self.assertRaises(GDResultSizeError):
+            self.conn_handler.execute_fetchall(sql, max_rows=3)
+        with self.assertRaises(GDResultSizeError):
+            self.conn_handler.execute_fetchall(sql, max_bytes=size - 1)
+        self.assertEqual(
+            len(self.conn_handler.execute_fetchall(sql, max_bytes=size)), 4)
+
+        # The handler limits are the default
+        obs = SQLConnectionHandler(max_rows=3)
+        with self.assertRaises(GDResultSizeError):
+            obs.execute_fetchall(sql)
+        self.assertEqual(len(obs.execute_fetchall(sql, max_rows=10)), 4)
+        obs.close()
+
+    def test_execute_fetchall_size_limits_rollback(self):
+        """execute_fetchall rolls back if the results are too large"""
+        self.conn_handler.execute(
+            "CREATE FUNCTION insert_row() RETURNS int AS "
+            "'INSERT INTO test_table (int_column) VALUES (1) RETURNING 1' "
+            "LANGUAGE SQL")
+        with self.assertRaises(GDResultSizeError):
+            self.conn_handler.execute_fetchall(
+                "SELECT insert_row() FROM generate_series(1, 2)", max_rows=1)
+        self._assert_sql_equal([])
+
+        # Read-only queries are not run in autocommit if limited
+        self.conn_handler.detect_read_only = True
+        with self.assertRaises(GDResultSizeError):
+            self.conn_handler.execute_fetchall(
+                "SELECT insert_row() FROM generate_series(1, 2)", max_rows=1)
+        self._assert_sql_equal([])
+
+    def test_execute_fetchall_size_limits_server_side(self):
+        """execute_fetchall reads results in chunks if asked to"""
+        sql = "SELECT * FROM generate_series(1, 100000)"
+        with self.assertRaises(GDResultSizeError):
+            self.conn_handler.execute_fetchall(sql, max_rows=10,
+                                               server_side=True)
+        obs = self.conn_handler.execute_fetchall(sql, max_rows=100000,
+                                                 server_side=True)
+        self.assertEqual(len(obs), 100000)
+        self.assertEqual(self.conn_handler.last_result_rows, 100000)
+
+        # The errors raised while fetching are execution errors
+        with self.assertRaises(GDExecutionError):
+            self.conn_handler.execute_fetchall(
+                "SELECT 1 / (5000 - i) FROM generate_series(1, 10000) i",
+                max_rows=100000, server_side=True)
+        self.assertEqual(
+            self.conn_handler.execute_fetchone("SELECT 1"), [1])
+
+        # Server side cursors need a transaction
+        self.conn_handler._connection.autocommit = True
+        with self.assertRaises(ValueError):
+            self.conn_handler.execute_fetchall(sql, server_side=True)
+
+    def test_execute_fetchall_size_limits_statements(self):
+        """The size limits do not restrict the statements that can run"""
+        self._populate_test_table()
+        obs = SQLConnectionHandler(max_rows=10, max_bytes=2**20)
+        self.assertEqual(obs.execute_fetchall(
+            "UPDATE test_table SET str_column = 'x' WHERE int_column = 1; "
+            "SELECT str_column FROM test_table WHERE int_column = 1"),
+            [['x']])
+
+        obs.create_queue("test_queue")
+        obs.add_to_queue("test_queue",
+                         "SELECT * INTO other_table FROM test_table")
+        obs.add_to_queue("test_queue",
+                         "SELECT COUNT(*) FROM other_table; "
+                         "UPDATE other_table SET int_column = 0")
+        obs.add_to_queue("test_queue",
+                         "SELECT DISTINCT int_column FROM other_table")
+        self.assertEqual(obs.execute_queue("test_queue"), [0])
+        obs.close()
+
+    def test_session(self):
+        """The handler session profile is applied to its connection"""
+        self._add_sessions()
+        default = self.conn_handler.execute_fetchone("SHOW work_mem")[0]
+
+        obs = SQLConnectionHandler(session='report')
+        self.assertEqual(obs.execute_fetchone("SHOW work_mem"), ['64MB'])
+        self.assertEqual(obs.execute_fetchone("SHOW jit"), ['off'])
+        # The calls can select another profile for their transaction
+        self.assertEqual(
+            obs.execute_fetchone("SHOW work_mem", session='oltp'), ['1MB'])
+        self.assertEqual(obs.execute_fetchall(
+            "SELECT current_setting('search_path')", session='oltp'),
+            [['other, public']])
+        self.assertEqual(obs.execute_fetchone("SHOW work_mem"), ['64MB'])
+        obs.close()
+
+        # The profile is applied again when the connection is reopened
+        self.assertEqual(obs.execute_fetchone("SHOW work_mem"), ['64MB'])
+        obs.close()
+
+        self.assertEqual(self.conn_handler.execute_fetchone(
+            "SHOW work_mem", session='report'), ['64MB'])
+        self.assertEqual(self.conn_handler.execute_fetchone(
+            "SHOW work_mem", read_only=True, session='report'), ['64MB'])
+        self.assertEqual(
+            self.conn_handler.execute_fetchone("SHOW work_mem"), [default])
+
+    def test_session_queue(self):
+        """execute_queue applies the session profile to its transaction"""
+        self._add_sessions()
+        self.conn_handler.create_queue("test_queue")
+        self.conn_handler.add_to_queue("test_queue", "SHOW work_mem")
+        self.assertEqual(
+            self.conn_handler.execute_queue("test_queue", session='report'),
+            ['64MB'])
+
+    def test_session_pooled(self):
+        """The session profile is reset when returned to the pool"""
+        self._add_sessions()
+        self._add_pooled_profile('pooled', 1, 1)
+        obs = SQLConnectionHandler(profile='pooled')
+        default = obs.execute_fetchone("SHOW work_mem")[0]
+        obs.close()
+
+        obs = SQLConnectionHandler(profile='pooled', session='oltp')
+        con = obs._connection
+        self.assertEqual(obs.execute_fetchone("SHOW work_mem"), ['1MB'])
+        obs.close()
+        obs = SQLConnectionHandler(profile='pooled')
+        self.assertIs(obs._connection, con)
+        self.assertEqual(obs.execute_fetchone("SHOW work_mem"), [default])
+        self.assertEqual(obs.execute_fetchone("SHOW search_path"),
+                         ['"$user", public'])
+        obs.close()
+
+    def test_session_edited(self):
+        """Editing a session profile applies and resets the new settings"""
+        self._add_sessions()
+        self._add_pooled_profile('pooled', 1, 1)
+        obs = SQLConnectionHandler(profile='pooled')
+        default = obs.execute_fetchone("SHOW work_mem")[0]
+        self.assertEqual(
+            obs.execute_fetchone("SHOW work_mem", session='oltp'), ['1MB'])
+        obs.close()
+
+        obs = SQLConnectionHandler(profile='pooled', session='oltp')
+        gd_config.sessions['oltp'] = {'work_mem': '2MB'}
+        self.assertEqual(
+            self.conn_handler.execute_fetchone("SHOW work_mem",
+                                               session='oltp'), ['2MB'])
+        # The settings applied by the handler are reset, not the new ones
+        obs.close()
+        obs = SQLConnectionHandler(profile='pooled')
+        self.assertEqual(obs.execute_fetchone("SHOW work_mem"), [default])
+        self.assertEqual(obs.execute_fetchone("SHOW search_path"),
+                         ['"$user", public'])
+        obs.close()
+
+        obs = SQLConnectionHandler(profile='pooled', session='oltp')
+        self.assertEqual(obs.execute_fetchone("SHOW work_mem"), ['2MB'])
+        obs.close()
+
+    def test_session_error(self):
+        """Unknown or invalid session profiles raise an error"""
+        self._add_sessions()
+        with self.assertRaises(ValueError):
+            SQLConnectionHandler(session='not a session')
+        with self.assertRaises(ValueError):
+            self.conn_handler.execute("SELECT 1", session='not a session')
+
+        gd_config.sessions['bad'] = {'work_mem': 'lots'}
+        with self.assertRaises(GDConnectionError):
+            SQLConnectionHandler(session='bad')
+        with self.assertRaises(GDExecutionError):
+            self.conn_handler.execute_fetchone("SELECT 1", session='bad')
+        self.assertEqual(self.conn_handler.execute_fetchone("SELECT 1"), [1])
+
+    def test_execute_fetch_read_only(self):
+        """execute_fetchone/all with read_only run outside a transaction"""
+        self._populate_test_table()
+        sql = "SELECT str_column FROM test_table WHERE int_column = %s"
+        con = self.conn_handler._connection
+
+        with self.conn_handler._sql_executor(sql, [1]):
+            self.assertEqual(con.get_transaction_status(),
+                             TRANSACTION_STATUS_INTRANS)
+        with self.conn_handler._sql_executor(sql, [1],
+                                             read_only=True) as cur:
+            self.assertEqual(con.get_transaction_status(),
+                             TRANSACTION_STATUS_IDLE)
+            self.assertEqual(cur.fetchone(), ['test1'])
+        self.assertFalse(con.autocommit)
+
+        self.assertEqual(
+            self.conn_handler.execute_fetchone(sql, [2], read_only=True),
+            ['test2'])
+        self.assertEqual(
+            self.conn_handler.execute_fetchall(sql, [3], read_only=True),
+            [['test3']])
+        self.assertFalse(con.autocommit)
+
+        # The handler autocommit is kept
+        self.conn_handler.autocommit = True
+        self.conn_handler.execute_fetchone(sql, [2], read_only=True)
+        self.assertTrue(con.autocommit)
+
+    def test_execute_fetch_read_only_error(self):
+        """Failing read-only queries restore the transaction mode"""
+        con = self.conn_handler._connection
+        with self.assertRaises(GDExecutionError):
+            self.conn_handler.execute_fetchone(
+                "SELECT * FROM not_a_table", read_only=True)
+        self.assertFalse(con.autocommit)
+        self.assertEqual(self.conn_handler.execute_fetchone("SELECT 1"), [1])
+
+    def test_detect_read_only(self):
+        """Plain SELECTs are detected as read-only if requested"""
+        self.assertFalse(self.conn_handler._is_read_only("SELECT 1"))
+
+        obs = SQLConnectionHandler(detect_read_only=True)
+        for sql in ("SELECT 1", "  select 1", "(SELECT 1) UNION (SELECT 2)",
+                    "VALUES (1)", "TABLE test_table", "SHOW search_path"):
+            self.assertTrue(obs._is_read_only(sql), sql)
+        for sql in ("INSERT INTO test_table (int_column) VALUES (1)",
+                    "WITH d AS (DELETE FROM test_table) SELECT 1",
+                    "SELECTED", "UPDATE test_table SET int_column = 1"):
+            self.assertFalse(obs._is_read_only(sql), sql)
+        # The caller has the last word
+        self.assertFalse(obs._is_read_only("SELECT 1", read_only=False))
+        self.assertTrue(obs._is_read_only("DELETE FROM t", read_only=True))
+
+        con = obs._connection
+        with obs._sql_executor("SELECT 1"):
+            self.assertEqual(con.get_transaction_status(),
+                             TRANSACTION_STATUS_IDLE)
+        with obs._sql_executor("SELECT 1", read_only=False):
+            self.assertEqual(con.get_transaction_status(),
+                             TRANSACTION_STATUS_INTRANS)
+        obs.close()
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_execute_fetch_columns(self):
+        """execute_fetch_columns returns the results by column"""
+        self._populate_test_table()
+        sql = ("SELECT int_column, str_column FROM test_table "
+               "WHERE bool_column = %s ORDER BY int_column")
+        obs = self.conn_handler.execute_fetch_columns(sql, [True])
+        self.assertEqual(list(obs), ['int_column', 'str_column'])
+        self.assertEqual(obs['int_column'].tolist(), [1, 2])
+        self.assertEqual(obs['str_column'].tolist(), ['test1', 'test2'])
+        self.assertEqual(self.conn_handler.last_result_rows, 2)
+
+        with self.assertRaises(ValueError):
+            self.conn_handler.execute_fetch_columns(sql, [True],
+                                                    use_cache=True)
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_execute_fetch_columns_cache(self):
+        """execute_fetch_columns reads and fills the disk cache"""
+        directory = mkdtemp()
+        self.addCleanup(rmtree, directory)
+        self._populate_test_table()
+        sql = "SELECT int_column FROM test_table ORDER BY int_column"
+        obs = SQLConnectionHandler(disk_cache=DiskCache(directory))
+
+        self.assertEqual(obs.execute_fetch_columns(
+            sql, use_cache=True, version='v1')['int_column'].tolist(),
+            [1, 2, 3, 4])
+        self.conn_handler.execute("DELETE FROM test_table")
+        self.assertEqual(obs.execute_fetch_columns(
+            sql, use_cache=True, version='v1')['int_column'].tolist(),
+            [1, 2, 3, 4])
+        self.assertEqual(obs.disk_cache.hits, 1)
+        self.assertEqual(obs.execute_fetch_columns(
+            sql, use_cache=True, version='v2')['int_column'].tolist(), [])
+        obs.close()
+
+    def test_execute_fetch_by_keys(self):
+        """execute_fetch_by_keys fetches the rows of all the keys"""
+        self._populate_test_table()
+        sql = ("SELECT int_column, str_column FROM test_table "
+               "WHERE int_column = ANY(%s)")
+        obs = self.conn_handler.execute_fetch_by_keys(
+            sql, [4, 1, 7, 1, 3], chunk_size=2)
+        self.assertEqual(obs, {1: [1, 'test1'], 3: [3, 'test3'],
+                               4: [4, 'test4'], 7: None})
+
+        # Keyed by column name
+        sql = "SELECT * FROM test_table WHERE str_column = ANY(%s)"
+        obs = self.conn_handler.execute_fetch_by_keys(
+            sql, ['test2', 'none'], key='str_column')
+        self.assertEqual(obs, {'test2': ['test2', True, 2], 'none': None})
+
+        self.assertEqual(self.conn_handler.execute_fetch_by_keys(sql, []), {})
+
+    def test_execute_fetch_by_keys_cache(self):
+        """execute_fetch_by_keys uses and populates the result cache"""
+        self._populate_test_table()
+        cache = ResultCache()
+        conn_handler = SQLConnectionHandler(result_cache=cache)
+        sql = ("SELECT int_column, str_column FROM test_table "
+               "WHERE int_column = ANY(%s)")
+        conn_handler.execute_fetch_by_keys(sql, [1, 7], use_cache=True)
+        self.assertEqual(cache.get((sql, 1)), [1, 'test1'])
+        self.assertTrue((sql, 7) in cache)
+
+        # The cached keys are not fetched again
+        cache.put((sql, 1), 'cached')
+        obs = conn_handler.execute_fetch_by_keys(sql, [1, 2, 7],
+                                                 use_cache=True)
+        self.assertEqual(obs, {1: 'cached', 2: [2, 'test2'], 7: None})
+
+        with self.assertRaises(ValueError):
+            self.conn_handler.execute_fetch_by_keys(sql, [1], use_cache=True)
+
+    def _create_keyed_table(self):
+        self.conn_handler.execute(
+            "CREATE TABLE keyed_table (id int PRIMARY KEY, name varchar, "
+            "active bool DEFAULT True NOT NULL)")
+        self.conn_handler.execute(
+            "INSERT INTO keyed_table (id, name) VALUES (1, 'one'), (2, 'two')")
+
+    def test_upsert_many(self):
+        """upsert_many inserts new rows and updates existing ones"""
+        self._create_keyed_table()
+        rows = [{'id': 2, 'name': 'new\ttwo'}, {'id': 3, 'name': None},
+                {'id': 4, 'name': 'back\\slash\n'}]
+        obs = self.conn_handler.upsert_many('keyed_table', ['id'], rows)
+        self.assertEqual(obs, (2, 1))
+
+        obs = self.conn_handler.execute_fetchall(
+            "SELECT * FROM keyed_table ORDER BY id")
+        self.assertEqual(obs, [[1, 'one', True], [2, 'new\ttwo', True],
+                               [3, None, True], [4, 'back\\slash\n', True]])
+
+    def test_upsert_many_autocommit(self):
+        """upsert_many runs in a transaction in autocommit"""
+        self._create_keyed_table()
+        self.conn_handler.autocommit = True
+        obs = self.conn_handler.upsert_many(
+            'keyed_table', ['id'],
+            [{'id': 2, 'name': 'b'}, {'id': 3, 'name': None}])
+        self.assertEqual(obs, (1, 1))
+        with self.assertRaises(GDExecutionError):
+            self.conn_handler.upsert_many(
+                'keyed_table', ['id'],
+                [{'id': 8, 'name': 'a'}, {'id': 8, 'name': 'b'}])
+        self.assertTrue(self.conn_handler._connection.autocommit)
+        self.assertEqual(self.conn_handler.execute_fetchall(
+            "SELECT id, name FROM keyed_table ORDER BY id"),
+            [[1, 'one'], [2, 'b'], [3, None]])
+
+    def test_upsert_many_only_keys(self):
+        """upsert_many only inserts when all the columns are keys"""
+        self._create_keyed_table()
+        obs = self.conn_handler.upsert_many(
+            'public.keyed_table', ['id'], [{'id': 1}, {'id': 5}])
+        self.assertEqual(obs, (1, 0))
+        self.assertEqual(self.conn_handler.execute_fetchone(
+            "SELECT COUNT(*) FROM keyed_table"), [3])
+
+    def test_upsert_many_empty(self):
+        """upsert_many does nothing without rows"""
+        self.assertEqual(self.conn_handler.upsert_many('test_table', ['id'],
+                                                       []), (0, 0))
+
+    def test_upsert_many_error(self):
+        """upsert_many rolls back the transaction on error"""
+        self._create_keyed_table()
+        with self.assertRaises(ValueError):
+            self.conn_handler.upsert_many('keyed_table', ['id'],
+                                          [{'name': 'no key'}])
+        with self.assertRaises(ValueError):
+            self.conn_handler.upsert_many('keyed_table', ['id'],
+                                          [{'id': 1, 'name': 'a'}, {'id': 2}])
+        with self.assertRaises(ValueError):
+            self.conn_handler.upsert_many(
+                'keyed_table', ['id'],
+                [{'id': 1, 'name': 'a'}, {'id': 2, 'active': False}])
+        # Duplicated keys
+        with self.assertRaises(GDExecutionError):
+            self.conn_handler.upsert_many(
+                'keyed_table', ['id'],
+                [{'id': 7, 'name': 'a'}, {'id': 7, 'name': 'b'}])
+        self.assertEqual(self.conn_handler.execute_fetchall(
+            "SELECT id FROM keyed_table ORDER BY id"), [[1], [2]])
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_copy_columns(self):
+        """copy_columns loads the column arrays"""
+        self.conn_handler.execute("ALTER TABLE test_table ADD f float8")
+        obs = self.conn_handler.copy_columns(
+            'test_table', [('int_column', np.array([3, 4], dtype=np.int64)),
+                           ('f', array('d', [0.5, -1])),
+                           ('bool_column', np.array([False, True]))],
+            chunk_rows=1)
+        self.assertEqual(obs, 2)
+        self._assert_sql_equal([('foo', False, 3, 0.5),
+                                ('foo', True, 4, -1.0)])
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_copy_columns_error(self):
+        """copy_columns rolls back if the types do not match"""
+        with self.assertRaises(GDExecutionError):
+            self.conn_handler.copy_columns(
+                'test_table',
+                {'int_column': np.array([1, 2], dtype=np.int32)})
+        self._assert_sql_equal([])
+
+        columns = {'int_column': np.array([1, 2], dtype=np.int64)}
+        for chunk_rows in (0, -1):
+            with self.assertRaises(ValueError):
+                self.conn_handler.copy_columns('test_table', columns,
+                                               chunk_rows=chunk_rows)
+        self._assert_sql_equal([])
+
+    def _populate_scan_table(self, n_rows):
+        self.conn_handler.execute(
+            "INSERT INTO test_table (int_column) "
+            "SELECT generate_series(1, %s)", [n_rows])
+
+    def _scan(self, *args, **kwargs):
+        chunks = list(self.conn_handler.parallel_scan(*args, **kwargs))
+        return sorted(row['int_column'] for chunk in chunks for row in chunk)
+
+    def test_parallel_scan(self):
+        """parallel_scan reads all the rows once in chunks"""
+        self._populate_scan_table(1000)
+        chunks = list(self.conn_handler.parallel_scan(
+            'test_table', 'int_column', partitions=4, chunk_size=100,
+            columns=['int_column', 'str_column']))
+        self.assertEqual(len(chunks), 12)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(sorted(row['int_column'] for chunk in chunks
+                                for row in chunk), list(range(1, 1001)))
+        self.assertEqual(chunks[0][0]['str_column'], 'foo')
+        self.assertEqual(len(chunks[0][0]), 2)
+
+        self.assertEqual(
+            self._scan('test_table', 'int_column', boundaries='quantiles',
+                       partitions=3, snapshot=False),
+            list(range(1, 1001)))
+        self.assertEqual(
+            self._scan('test_table', 'int_column', partitions=1),
+            list(range(1, 1001)))
+        # The handler is usable afterwards
+        self.assertEqual(self.conn_handler.execute_fetchone(
+            "SELECT COUNT(*) FROM test_table"), [1000])
+
+    def test_parallel_scan_edge_cases(self):
+        """parallel_scan reads empty tables and the rows with NULL keys"""
+        self.assertEqual(self._scan('test_table', 'int_column'), [])
+
+        self.conn_handler.execute("ALTER TABLE test_table ADD f float8")
+        self.conn_handler.execute(
+            "INSERT INTO test_table (int_column, f) VALUES "
+            "(1, NULL), (2, 0.5), (3, 0.5), (4, 2.5)")
+        self.assertEqual(self._scan('test_table', 'f', partitions=8),
+                         [1, 2, 3, 4])
+        self.assertEqual(self._scan('test_table', 'f', partitions=8,
+                                    boundaries='quantiles'), [1, 2, 3, 4])
+        with self.assertRaises(TypeError):
+            self._scan('test_table', 'str_column')
+
+    def test_parallel_scan_snapshot(self):
+        """parallel_scan reads all the partitions in the same snapshot"""
+        self._populate_scan_table(100)
+        chunks = self.conn_handler.parallel_scan(
+            'test_table', 'int_column', partitions=2, chunk_size=10)
+        first = next(chunks)
+        other = SQLConnectionHandler()
+        other.execute("DELETE FROM test_table WHERE int_column > 50")
+        other.close()
+        rows = [row['int_column'] for chunk in chunks for row in chunk]
+        self.assertEqual(sorted(rows + [row['int_column'] for row in first]),
+                         list(range(1, 101)))
+
+    def test_parallel_scan_handler_config(self):
+        """The partitions run with the configuration of the handler"""
+        self._add_sessions()
+        self._populate_scan_table(100)
+        self.conn_handler.execute(
+            "CREATE VIEW scan_view AS SELECT int_column, "
+            "current_setting('work_mem') AS work_mem FROM test_table")
+        admission = AdmissionController([('batch', 1)])
+        obs = SQLConnectionHandler(session='report', admission=admission,
+                                   lane='batch')
+        chunks = list(obs.parallel_scan('scan_view', 'int_column',
+                                        partitions=2, snapshot=False))
+        rows = [row for chunk in chunks for row in chunk]
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(set(row['work_mem'] for row in rows), {'64MB'})
+        self.assertEqual(admission.metrics()['batch']['admitted'], 2)
+        obs.close()
+
+    def test_parallel_scan_close(self):
+        """Closing a parallel_scan stops the partitions"""
+        self._populate_scan_table(1000)
+        chunks = self.conn_handler.parallel_scan(
+            'test_table', 'int_column', partitions=4, chunk_size=10)
+        self.assertEqual(len(next(chunks)), 10)
+        chunks.close()
+        self.assertEqual(self.conn_handler.execute_fetchone(
+            "SELECT COUNT(*) FROM test_table"), [1000])
+
+    def test_parallel_scan_error(self):
+        """parallel_scan raises the errors of the partitions"""
+        self._populate_scan_table(10)
+        # The arguments are validated without iterating the generator
+        with self.assertRaises(ValueError):
+            self.conn_handler.parallel_scan('test_table', 'int_column',
+                                            partitions=0)
+        with self.assertRaises(ValueError):
+            self.conn_handler.parallel_scan('test_table', 'int_column',
+                                            boundaries='median')
+        with self.assertRaises(GDExecutionError):
+            self._scan('test_table', 'not_a_column')
+        with self.assertRaises(GDExecutionError):
+            self._scan('test_table', 'int_column', columns=['not_a_column'])
+        self.conn_handler.execute(
+            "CREATE VIEW slow_table AS "
+            "SELECT int_column, pg_sleep(1) IS NULL AS slept FROM test_table")
+        # Computing the key ranges and reading a partition time out
+        with self.assertRaises(GDTimeoutError):
+            self._scan('slow_table', 'int_column', timeout=0.1)
+        with self.assertRaises(GDTimeoutError):
+            self._scan('slow_table', 'int_column', partitions=1, timeout=0.1)
+        self.assertEqual(self.conn_handler.execute_fetchone("SELECT 1"), [1])
+
     def test_create_queue(self):
         """create_queue initializes a new queue"""
         self.assertEqual(self.conn_handler.queues, {})
@@ -311,6 +1012,28 @@ class TestConnHandler(TestCase):
 
         self._assert_sql_equal([('test_insert', False, 20)])
 
+    def test_execute_queue_size_limits(self):
+        """execute_queue enforces the size limits on all its results"""
+        self._populate_test_table()
+        sql = "SELECT int_column FROM test_table WHERE bool_column = %s"
+        self.conn_handler.create_queue("test_queue")
+        self.conn_handler.add_to_queue(
+            "test_queue", "INSERT INTO test_table (int_column) VALUES (5)")
+        self.conn_handler.add_to_queue("test_queue", sql, [True])
+        self.conn_handler.add_to_queue("test_queue", sql, [False])
+        with self.assertRaises(GDResultSizeError):
+            self.conn_handler.execute_queue("test_queue", max_rows=4)
+        self.assertEqual(self.conn_handler.execute_fetchone(
+            "SELECT COUNT(*) FROM test_table"), [4])
+
+        self.conn_handler.create_queue("test_queue")
+        self.conn_handler.add_to_queue("test_queue", sql, [True])
+        self.conn_handler.add_to_queue("test_queue", sql, [False])
+        obs = self.conn_handler.execute_queue("test_queue", max_rows=4)
+        self.assertEqual(obs, [1, 2, 3, 4])
+        self.assertEqual(self.conn_handler.last_result_rows, 4)
+        self.assertTrue(self.conn_handler.last_result_bytes > 0)
+
     def test_execute_queue_many(self):
         sql = "INSERT INTO test_table (str_column, int_column) VALUES (%s, %s)"
         sql_args = [('insert1', 1), ('insert2', 2), ('insert3', 3)]
@@ -374,6 +1097,20 @@ class TestConnHandler(TestCase):
         # make sure rollback correctly
         self._assert_sql_equal([])
 
+    def test_execute_queue_timeout(self):
+        """execute_queue cancels and rolls back the whole transaction"""
+        self.conn_handler.create_queue("test_queue")
+        self.conn_handler.add_to_queue(
+            "test_queue",
+            "INSERT INTO test_table (int_column) VALUES (%s)", (2,))
+        self.conn_handler.add_to_queue("test_queue", "SELECT pg_sleep(5)")
+
+        with self.assertRaises(GDTimeoutError):
+            self.conn_handler.execute_queue("test_queue", timeout=0.1)
+
+        self.assertEqual(self.conn_handler.queues, {})
+        self._assert_sql_equal([])
+
     def test_huge_queue(self):
         self.conn_handler.create_queue("test_queue")
         # add tons of inserts to queue
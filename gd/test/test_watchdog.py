@@ -0,0 +1,59 @@
+from threading import Event, Thread
+from time import sleep, time
+from unittest import TestCase, main
+
+from gd.watchdog import CancelWatchdog
+
+
+class SlowConnection(object):
+    """Connection whose cancel request blocks until released"""
+    def __init__(self):
+        self.started = Event()
+        self.release = Event()
+        self.cancelled = False
+
+    def cancel(self):
+        self.started.set()
+        self.release.wait(5)
+        self.cancelled = True
+
+
+class TestCancelWatchdog(TestCase):
+    def test_cancel(self):
+        """The connections are cancelled once their deadline expires"""
+        watchdog = CancelWatchdog()
+        connection = SlowConnection()
+        connection.release.set()
+        watchdog.arm(connection, 0.05)
+        self.assertTrue(connection.started.wait(5))
+
+        connection = SlowConnection()
+        watchdog.disarm(watchdog.arm(connection, 0.05))
+        sleep(0.2)
+        self.assertFalse(connection.started.is_set())
+
+    def test_cancel_outside_lock(self):
+        """A slow cancel request does not block the other connections"""
+        watchdog = CancelWatchdog()
+        slow = SlowConnection()
+        token = watchdog.arm(slow, 0)
+        self.assertTrue(slow.started.wait(5))
+
+        start = time()
+        watchdog.disarm(watchdog.arm(SlowConnection(), 10))
+        self.assertTrue(time() - start < 1)
+
+        # disarm waits for the cancel request in flight
+        def release():
+            sleep(0.1)
+            slow.release.set()
+
+        thread = Thread(target=release)
+        thread.start()
+        watchdog.disarm(token)
+        self.assertTrue(slow.cancelled)
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from os import close, remove
+from tempfile import mkstemp
+from unittest import TestCase, main
+
+from gd.sql_connection import SQLConnectionHandler
+from gd.exceptions import GDExecutionError
+from gd.workload import WorkloadRecorder, read_log, replay, format_report
+
+
+class TestWorkload(TestCase):
+    def setUp(self):
+        fd, self.log_fp = mkstemp(suffix='.log')
+        close(fd)
+        self.recorder = WorkloadRecorder(self.log_fp)
+        self.conn_handler = SQLConnectionHandler(recorder=self.recorder)
+        self.conn_handler.execute(
+            "CREATE TABLE gd_workload_test (id int, name varchar)")
+
+    def tearDown(self):
+        self.recorder.close()
+        remove(self.log_fp)
+        self.conn_handler.recorder = None
+        self.conn_handler.execute("DROP TABLE gd_workload_test")
+        self.conn_handler.close()
+
+    def _record_calls(self):
+        sql = "INSERT INTO gd_workload_test (id, name) VALUES (%s, %s)"
+        self.conn_handler.executemany(sql, [(1, 'a'), (2, 'b')])
+        self.conn_handler.create_queue('queue')
+        self.conn_handler.add_to_queue(
+            'queue', sql + " RETURNING name", [3, 'c'])
+        self.conn_handler.add_to_queue(
+            'queue', "UPDATE gd_workload_test SET id = 4 WHERE name = %s",
+            ['{0}'])
+        self.conn_handler.execute_queue('queue')
+        self.conn_handler.execute_fetchall(
+            "SELECT * FROM gd_workload_test WHERE id > %s", [0])
+        with self.assertRaises(GDExecutionError):
+            self.conn_handler.execute("SELECT * FROM not_a_table")
+        self.recorder.flush()
+
+    def test_record(self):
+        """The recorder logs all the calls of the handler"""
+        self._record_calls()
+        calls = read_log(self.log_fp)
+        # The CREATE TABLE of setUp is also recorded
+        self.assertEqual([c['kind'] for c in calls],
+                         ['execute', 'executemany', 'queue', 'execute',
+                          'execute'])
+        self.assertEqual(calls[1]['stmts'][0][1], [[1, 'a'], [2, 'b']])
+        self.assertEqual(calls[2]['stmts'][1],
+                         ["UPDATE gd_workload_test SET id = 4 "
+                          "WHERE name = %s", ['{0}']])
+        self.assertEqual(calls[3]['stmts'],
+                         [["SELECT * FROM gd_workload_test WHERE id > %s",
+                           [0]]])
+        self.assertTrue(calls[4]['failed'])
+        self.assertFalse('failed' in calls[3])
+        for call in calls:
+            self.assertTrue(call['dur'] >= 0)
+        self.assertEqual(calls, sorted(calls, key=lambda c: c['t']))
+
+    def test_replay(self):
+        """replay runs all the recorded calls and reports their latency"""
+        self._record_calls()
+        calls = read_log(self.log_fp)[1:]
+        self.conn_handler.execute("DELETE FROM gd_workload_test")
+
+        report = replay(calls, speed=0, concurrency=2)
+        self.assertEqual(report['calls'], 4)
+        self.assertEqual(report['errors'], 1)
+        self.assertTrue(report['throughput'] > 0)
+        self.assertTrue(report['latency']['p50'] <= report['latency']['max'])
+
+        obs = self.conn_handler.execute_fetchall(
+            "SELECT * FROM gd_workload_test ORDER BY id")
+        self.assertEqual(obs, [[1, 'a'], [2, 'b'], [4, 'c']])
+        self.assertTrue('throughput' in format_report(report))
+
+    def test_replay_queue_placeholders(self):
+        """replay replaces the placeholders of the queues read from a log"""
+        self._record_calls()
+        calls = [c for c in read_log(self.log_fp) if c['kind'] == 'queue']
+        self.conn_handler.execute("DELETE FROM gd_workload_test")
+
+        report = replay(calls, speed=0)
+        self.assertEqual(report['errors'], 0)
+        obs = self.conn_handler.execute_fetchall(
+            "SELECT * FROM gd_workload_test")
+        self.assertEqual(obs, [[4, 'c']])
+
+
+if __name__ == "__main__":
+    main()
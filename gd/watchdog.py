@@ -0,0 +1,156 @@
+r"""
+Query watchdog (:mod:`gd.watchdog`)
+===================================
+
+.. currentmodule:: gd.watchdog
+
+This module provides a single background thread that cancels the running
+query of a connection once its deadline has passed. It is used by
+:class:`gd.sql_connection.SQLConnectionHandler` to enforce timeouts without
+adding any round-trip to the database: the deadline is kept client side and
+only when it expires a libpq cancel request is sent to the server.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   CancelWatchdog
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from heapq import heappush, heappop, heapify
+from itertools import count
+from threading import Condition, Lock, Thread
+from time import time
+
+from psycopg2 import Error as PostgresError
+
+
+class CancelWatchdog(object):
+    """Cancels the running query of a connection once its deadline expires
+
+    Notes
+    -----
+    The cancel request is sent outside the watchdog lock, so a slow cancel
+    does not delay arming and disarming other connections. Instead, each
+    cancel in flight holds a lock of its own, which `disarm` waits for, so
+    once `disarm` returns the watchdog will not touch the connection
+    anymore. If the query already finished when the cancel request reaches
+    the server, the request has no effect.
+    """
+
+    def __init__(self):
+        self._lock = Condition()
+        # heap of (deadline, token) and the connections still armed, keyed by
+        # token. Disarmed tokens are removed lazily from the heap
+        self._heap = []
+        self._armed = {}
+        # The locks of the cancel requests in flight, keyed by token
+        self._cancelling = {}
+        self._tokens = count()
+        self._thread = None
+
+    def arm(self, connection, timeout):
+        """Schedules the cancellation of the query running on `connection`
+
+        Parameters
+        ----------
+        connection : psycopg2.connection
+            The connection whose running query should be cancelled
+        timeout : float
+            Number of seconds from now after which the query is cancelled
+
+        Returns
+        -------
+        int
+            The token to pass to `disarm` once the query has finished
+        """
+        with self._lock:
+            token = next(self._tokens)
+            heappush(self._heap, (time() + timeout, token))
+            self._armed[token] = connection
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run,
+                                      name='gd-cancel-watchdog')
+                self._thread.daemon = True
+                self._thread.start()
+            self._lock.notify()
+        return token
+
+    def disarm(self, token):
+        """Cancels a scheduled cancellation
+
+        Parameters
+        ----------
+        token : int
+            The token returned by `arm`
+        """
+        with self._lock:
+            self._armed.pop(token, None)
+            cancelling = self._cancelling.get(token)
+            # Avoid growing the heap indefinitely with disarmed entries when
+            # the timeouts are much larger than the query durations
+            if len(self._heap) > 2 * len(self._armed) + 64:
+                self._heap = [entry for entry in self._heap
+                              if entry[1] in self._armed]
+                heapify(self._heap)
+
+        if cancelling is not None:
+            # Wait for the cancel request in flight to be sent
+            with cancelling:
+                pass
+
+    def _run(self):
+        while True:
+            with self._lock:
+                token, connection = self._next_expired()
+                cancelling = Lock()
+                cancelling.acquire()
+                self._cancelling[token] = cancelling
+
+            try:
+                connection.cancel()
+            except PostgresError:
+                # The connection has been closed in the meantime, so there is
+                # nothing left to cancel
+                pass
+            finally:
+                with self._lock:
+                    del self._cancelling[token]
+                cancelling.release()
+
+    def _next_expired(self):
+        """Waits for the next deadline to expire, with the lock held
+
+        Returns
+        -------
+        tuple of (int, psycopg2.connection)
+            The token and the connection whose deadline expired, which are
+            no longer armed
+        """
+        while True:
+            while self._heap and self._heap[0][1] not in self._armed:
+                heappop(self._heap)
+
+            if not self._heap:
+                self._lock.wait()
+                continue
+
+            deadline, token = self._heap[0]
+            remaining = deadline - time()
+            if remaining > 0:
+                self._lock.wait(remaining)
+                continue
+
+            heappop(self._heap)
+            return token, self._armed.pop(token)
+
+
+watchdog = CancelWatchdog()
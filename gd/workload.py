@@ -0,0 +1,313 @@
+r"""
+Workload capture and replay (:mod:`gd.workload`)
+================================================
+
+.. currentmodule:: gd.workload
+
+This module records the SQL calls done through
+:class:`gd.sql_connection.SQLConnectionHandler` objects to a log file, and
+replays such a log against a database with a given speed and concurrency,
+reporting the throughput and latency percentiles.
+
+Classes
+-------
+
+.. autosummary::
+   :toctree: generated/
+
+   WorkloadRecorder
+
+Functions
+---------
+
+.. autosummary::
+   :toctree: generated/
+
+   read_log
+   replay
+   format_report
+
+Examples
+--------
+Record the calls of a handler:
+
+>>> from gd.sql_connection import SQLConnectionHandler
+>>> from gd.workload import WorkloadRecorder
+>>> recorder = WorkloadRecorder('workload.log') # doctest: +SKIP
+>>> conn_handler = SQLConnectionHandler(recorder=recorder) # doctest: +SKIP
+
+Replay them at twice the original speed with 8 concurrent handlers, using
+the connection profile 'local' of the gd configuration:
+
+    $ python -m gd.workload workload.log --speed 2 --concurrency 8 \
+        --profile local
+"""
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The biocore Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import division, print_function
+from argparse import ArgumentParser
+from json import dumps, loads
+from threading import Lock, Thread
+from time import sleep, time
+
+from future import standard_library
+with standard_library.hooks():
+    from queue import Queue
+
+from gd.exceptions import GDError
+from gd.sql_connection import SQLConnectionHandler
+
+
+class WorkloadRecorder(object):
+    """Records the SQL calls of handlers to a log file
+
+    The log has one JSON object per line and call, with the keys 't' (the
+    start of the call, in seconds since the recorder was created), 'kind'
+    ('execute', 'executemany' or 'queue'), 'dur' (the duration of the call,
+    in seconds), 'stmts' (list of [sql, sql_args] pairs; queues keep their
+    placeholders) and, only if the call failed, 'failed'.
+
+    Parameters
+    ----------
+    log_fp : str
+        The path of the log file. If it exists, the calls are appended
+
+    Notes
+    -----
+    The recorder can be shared by several handlers, also from different
+    threads. Arguments that are not JSON serializable (e.g. dates) are
+    recorded as strings, which postgres casts back when replayed.
+    """
+
+    def __init__(self, log_fp):
+        self._file = open(log_fp, 'a')
+        self._lock = Lock()
+        self._start = time()
+
+    def record(self, kind, statements, start, duration, failed=False):
+        """Records a call
+
+        Parameters
+        ----------
+        kind : {'execute', 'executemany', 'queue'}
+            The kind of call
+        statements : list of (str, object)
+            The SQL queries of the call and their arguments
+        start : float
+            The time at which the call started, as returned by time.time
+        duration : float
+            The number of seconds that the call took
+        failed : bool, optional
+            Whether the call failed
+        """
+        entry = {'t': round(start - self._start, 6), 'kind': kind,
+                 'dur': round(duration, 6),
+                 'stmts': [[sql, sql_args] for sql, sql_args in statements]}
+        if failed:
+            entry['failed'] = True
+        line = dumps(entry, separators=(',', ':'), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def flush(self):
+        """Writes the recorded calls to the log file"""
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """Closes the log file"""
+        with self._lock:
+            self._file.close()
+
+
+def read_log(log_fp):
+    """Reads a log written by a WorkloadRecorder
+
+    Parameters
+    ----------
+    log_fp : str
+        The path of the log file
+
+    Returns
+    -------
+    list of dict
+        The recorded calls, sorted by start time
+    """
+    with open(log_fp) as f:
+        calls = [loads(line) for line in f if line.strip()]
+    return sorted(calls, key=lambda call: call['t'])
+
+
+def _run_call(conn_handler, call):
+    stmts = call['stmts']
+    if call['kind'] == 'queue':
+        queue = 'gd_replay'
+        conn_handler.create_queue(queue)
+        for sql, sql_args in stmts:
+            conn_handler.add_to_queue(queue, sql, sql_args)
+        try:
+            conn_handler.execute_queue(queue)
+        finally:
+            conn_handler.queues.pop(queue, None)
+    else:
+        sql, sql_args = stmts[0]
+        many = call['kind'] == 'executemany'
+        with conn_handler._sql_executor(sql, sql_args, many) as cur:
+            # Fetch the results too, as the original call most likely did
+            if not many and cur.description is not None:
+                cur.fetchall()
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    pos = int(round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[pos]
+
+
+def replay(calls, speed=1.0, concurrency=1, profile='default'):
+    """Replays recorded calls against a database
+
+    Parameters
+    ----------
+    calls : list of dict or str
+        The calls, as returned by `read_log`, or the path of the log file
+    speed : float, optional
+        How many times faster than recorded the calls are issued. If 0, the
+        calls are issued as fast as possible. Default: 1
+    concurrency : int, optional
+        The number of concurrent handlers running the calls. Default: 1
+    profile : str, optional
+        The connection profile of the gd configuration used to connect.
+        Default: 'default'
+
+    Returns
+    -------
+    dict
+        The report, with the keys 'calls', 'errors', 'elapsed' (seconds),
+        'throughput' (calls per second), 'latency' (dict with the 'p50',
+        'p90', 'p99' and 'max' latencies, in seconds) and 'lag' (the maximum
+        delay between the scheduled and the actual start of a call, which
+        shows whether the concurrency was enough to keep up)
+
+    Notes
+    -----
+    Each call is replayed in its own transaction by one of the handlers, so
+    the calls of different original handlers may run in a different order
+    than recorded when they overlap.
+    """
+    if not isinstance(calls, list):
+        calls = read_log(calls)
+
+    pending = Queue()
+    latencies = []
+    lags = []
+    errors = [0]
+    lock = Lock()
+
+    def worker(conn_handler):
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                call, scheduled = item
+                start = time()
+                try:
+                    _run_call(conn_handler, call)
+                except GDError:
+                    with lock:
+                        errors[0] += 1
+                end = time()
+                with lock:
+                    latencies.append(end - start)
+                    lags.append(max(start - scheduled, 0))
+        finally:
+            conn_handler.close()
+
+    # Connect before starting, so connection errors are raised here
+    conn_handlers = [SQLConnectionHandler(profile=profile)
+                     for _ in range(concurrency)]
+    workers = [Thread(target=worker, args=(conn_handler,))
+               for conn_handler in conn_handlers]
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+
+    begin = time()
+    for call in calls:
+        scheduled = begin + (call['t'] / speed if speed else 0)
+        delay = scheduled - time()
+        if delay > 0:
+            sleep(delay)
+        pending.put((call, scheduled))
+    for _ in workers:
+        pending.put(None)
+    for thread in workers:
+        thread.join()
+    elapsed = time() - begin
+
+    latencies.sort()
+    return {'calls': len(calls), 'errors': errors[0], 'elapsed': elapsed,
+            'throughput': len(calls) / elapsed if elapsed else 0,
+            'latency': {'p50': _percentile(latencies, 50),
+                        'p90': _percentile(latencies, 90),
+                        'p99': _percentile(latencies, 99),
+                        'max': latencies[-1] if latencies else None},
+            'lag': max(lags) if lags else None}
+
+
+def format_report(report):
+    """Formats a report returned by `replay` for humans
+
+    Parameters
+    ----------
+    report : dict
+        The report returned by `replay`
+
+    Returns
+    -------
+    str
+    """
+    lines = ["calls:      %d (%d errors)"
+             % (report['calls'], report['errors']),
+             "elapsed:    %.3f s" % report['elapsed'],
+             "throughput: %.1f calls/s" % report['throughput']]
+    for name in ('p50', 'p90', 'p99', 'max'):
+        value = report['latency'][name]
+        if value is not None:
+            lines.append("latency %-3s %.3f ms" % (name, value * 1000))
+    if report['lag'] is not None:
+        lines.append("max lag:    %.3f ms" % (report['lag'] * 1000))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        description="Replays a workload recorded by gd.workload."
+                    "WorkloadRecorder and reports throughput and latency")
+    parser.add_argument('log_fp', help="The path of the workload log")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="How many times faster than recorded the calls "
+                             "are issued, 0 for as fast as possible "
+                             "(default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="The number of concurrent handlers "
+                             "(default: %(default)s)")
+    parser.add_argument('--profile', default='default',
+                        help="The connection profile of the gd configuration "
+                             "(default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    report = replay(args.log_fp, speed=args.speed,
+                    concurrency=args.concurrency, profile=args.profile)
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
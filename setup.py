@@ -40,7 +40,8 @@ setup(name='gd',
       test_suite='nose.collector',
       packages=['gd'],
       package_data={'gd': ['support_files/config.txt']},
-      extras_require={'test': ["nose >= 0.10.1", "pep8", 'flake8']},
-      install_requires=['psycopg2', 'future==0.13.0'],
+      extras_require={'test': ["nose >= 0.10.1", "pep8", 'flake8'],
+                      'numpy': ['numpy']},
+      install_requires=['psycopg2 >= 2.8', 'future==0.13.0'],
       classifiers=classifiers
       )